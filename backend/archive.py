@@ -0,0 +1,411 @@
+"""
+Closed-Period Archive
+Moves a closed filing period out of the hot stores (Neo4j graph + Mongo `invoices`)
+into columnar files, one partition per period, and answers historical
+reconciliation / stats queries from memory-mapped columns.
+
+Layout (ARCHIVE_DIR, default ./archive):
+    period=2025-07/
+        _meta.json                 period summary (by_type, counts, archived_at)
+        graph_invoices/            Invoice nodes reported in the period
+        filings/                   (invoice_id, return_type) REPORTED_IN links
+        mismatches/                full_reconciliation()["mismatches"], in order
+        near_miss_candidates/      full_reconciliation()["near_miss_candidates"]
+        mongo_invoices/            the API's invoice documents for the period
+    each table dir: _schema.json + one .npy per column (+ .null.npy / .int.npy masks)
+
+Usage:
+    python archive.py --period 2025-04            # export, verify, prune
+    python archive.py --period 2025-04 --no-prune # export + verify only
+"""
+
+import json
+import os
+import shutil
+from datetime import date, datetime
+
+import numpy as np
+
+
+TABLES = ("graph_invoices", "filings", "mismatches", "near_miss_candidates", "mongo_invoices")
+
+
+def archive_root(root=None):
+    return root or os.environ.get("ARCHIVE_DIR", "archive")
+
+
+def _partition(root, period):
+    return os.path.join(archive_root(root), f"period={period}")
+
+
+def _plain(value):
+    """Driver/BSON values -> plain Python (neo4j Date -> datetime.date)"""
+    if hasattr(value, "to_native"):
+        return value.to_native()
+    return value
+
+
+# ============================================================
+# Column encoding
+# ============================================================
+def _kind(values):
+    present = [v for v in values if v is not None]
+    if not present:
+        return "null"
+    if all(isinstance(v, bool) for v in present):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "float"
+    if all(isinstance(v, date) and not isinstance(v, datetime) for v in present):
+        return "date"
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    return "json"
+
+
+def write_table(path, records):
+    """Write a list of dicts as a column directory; key order and missing keys are preserved"""
+    os.makedirs(path, exist_ok=True)
+    records = [{k: _plain(v) for k, v in r.items()} for r in records]
+    n = len(records)
+
+    keysets, keyset_codes, columns = [], [], []
+    index = {}
+    for r in records:
+        keys = tuple(r.keys())
+        if keys not in index:
+            index[keys] = len(keysets)
+            keysets.append(list(keys))
+        keyset_codes.append(index[keys])
+        for k in keys:
+            if k not in columns:
+                columns.append(k)
+    np.save(os.path.join(path, "__keys__.npy"), np.asarray(keyset_codes, dtype=np.int32))
+
+    schema = {"rows": n, "keysets": keysets, "columns": {}}
+    for c, name in enumerate(columns):
+        values = [r.get(name) for r in records]
+        kind = _kind(values)
+        nulls = np.fromiter((v is None for v in values), dtype=bool, count=n)
+        spec = {"kind": kind, "file": f"c{c}"}
+        base = os.path.join(path, spec["file"])
+
+        if kind == "bool":
+            np.save(base + ".npy", np.asarray([bool(v) for v in values], dtype=bool))
+        elif kind == "int":
+            np.save(base + ".npy", np.asarray([v or 0 for v in values], dtype=np.int64))
+        elif kind == "float":
+            np.save(base + ".npy", np.asarray([float(v or 0) for v in values], dtype=np.float64))
+            is_int = np.fromiter((isinstance(v, int) for v in values), dtype=bool, count=n)
+            if is_int.any():
+                np.save(base + ".int.npy", is_int)
+        elif kind == "date":
+            np.save(base + ".npy", np.asarray([v.isoformat() if v else "NaT" for v in values],
+                                              dtype="datetime64[D]"))
+        elif kind in ("str", "json"):
+            texts = [(v if kind == "str" else json.dumps(v, default=str)) if v is not None else ""
+                     for v in values]
+            distinct = sorted(set(texts))
+            if len(distinct) <= max(1, n // 2):
+                # Repetitive (statuses, GSTINs, names): dictionary-encode
+                codes = {t: i for i, t in enumerate(distinct)}
+                np.save(base + ".npy", np.asarray([codes[t] for t in texts], dtype=np.int32))
+                spec["dictionary"] = distinct
+            else:
+                np.save(base + ".npy", np.asarray(texts, dtype=str))
+        if kind != "null" and nulls.any():
+            np.save(base + ".null.npy", nulls)
+        schema["columns"][name] = spec
+
+    with open(os.path.join(path, "_schema.json"), "w") as f:
+        json.dump(schema, f)
+
+
+class ArchivedTable:
+    """Memory-mapped view of one table partition"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "_schema.json")) as f:
+            self.schema = json.load(f)
+        self.rows = self.schema["rows"]
+        self._cache = {}
+
+    def _load(self, filename):
+        full = os.path.join(self.path, filename)
+        if filename not in self._cache:
+            self._cache[filename] = np.load(full, mmap_mode="r") if os.path.exists(full) else None
+        return self._cache[filename]
+
+    def raw(self, name):
+        """The stored array for a column (dictionary codes for encoded strings)"""
+        return self._load(self.schema["columns"][name]["file"] + ".npy")
+
+    def null_mask(self, name):
+        """Boolean array marking null rows of a column, or None if it has none"""
+        return self._load(self.schema["columns"][name]["file"] + ".null.npy")
+
+    def code_of(self, name, value):
+        """Dictionary code of a string value, or -1 if absent"""
+        dictionary = self.schema["columns"][name].get("dictionary", [])
+        return dictionary.index(value) if value in dictionary else -1
+
+    def column(self, name):
+        """Decoded Python values for a column (None for nulls)"""
+        spec = self.schema["columns"][name]
+        kind, base = spec["kind"], spec["file"]
+        if kind == "null":
+            return [None] * self.rows
+        data = self._load(base + ".npy")
+        nulls = self._load(base + ".null.npy")
+        if kind == "bool":
+            values = [bool(v) for v in data]
+        elif kind == "int":
+            values = data.tolist()
+        elif kind == "float":
+            is_int = self._load(base + ".int.npy")
+            values = data.tolist()
+            if is_int is not None:
+                values = [int(v) if flag else v for v, flag in zip(values, is_int)]
+        elif kind == "date":
+            values = [d.item() if not np.isnat(d) else None for d in data]
+        else:
+            if "dictionary" in spec:
+                dictionary = spec["dictionary"]
+                values = [dictionary[c] for c in data]
+            else:
+                values = data.tolist()
+            if kind == "json":
+                values = [json.loads(v) if v else None for v in values]
+        if nulls is not None:
+            values = [None if null else v for v, null in zip(values, nulls)]
+        return values
+
+    def records(self):
+        keyset_codes = self._load("__keys__.npy")
+        keysets = self.schema["keysets"]
+        columns = {name: self.column(name) for name in self.schema["columns"]}
+        return [{k: columns[k][row] for k in keysets[code]} for row, code in enumerate(keyset_codes)]
+
+
+# ============================================================
+# Read path
+# ============================================================
+class ArchiveReader:
+    """Answers historical queries for archived periods from memory-mapped columns"""
+
+    def __init__(self, root=None):
+        self.root = archive_root(root)
+
+    def periods(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d.split("=", 1)[1] for d in os.listdir(self.root) if d.startswith("period="))
+
+    def has(self, period):
+        return os.path.exists(os.path.join(_partition(self.root, period), "_meta.json"))
+
+    def meta(self, period):
+        with open(os.path.join(_partition(self.root, period), "_meta.json")) as f:
+            return json.load(f)
+
+    def table(self, period, name):
+        return ArchivedTable(os.path.join(_partition(self.root, period), name))
+
+    def full_reconciliation(self, period):
+        """Same shape and values ReconciliationEngine.full_reconciliation returned at archive time"""
+        meta = self.meta(period)
+        return {
+            "period": period,
+            "total_mismatches": meta["total_mismatches"],
+            "by_type": meta["by_type"],
+            "near_miss_candidates": self.table(period, "near_miss_candidates").records(),
+            "mismatches": self.table(period, "mismatches").records(),
+        }
+
+    def stats(self, period):
+        """Per-period equivalent of /api/stats, computed on the mmapped columns without decoding rows"""
+        invoices = self.table(period, "mongo_invoices")
+        total = invoices.rows
+        if total == 0:
+            return {"period": period, "totalInvoices": 0, "totalMismatches": 0, "atRiskITC": 0, "matchRate": 0}
+        columns = invoices.schema["columns"]
+        # Like /api/stats ({"$ne": "Matched"}), a missing or null status counts as a mismatch
+        spec = columns.get("matchStatus", {"kind": "null"})
+        if spec["kind"] == "null":
+            mismatch = np.ones(total, dtype=bool)
+        else:
+            status = invoices.raw("matchStatus")
+            if "dictionary" in spec:
+                mismatch = status != invoices.code_of("matchStatus", "Matched")
+            else:
+                mismatch = status != "Matched"
+            nulls = invoices.null_mask("matchStatus")
+            if nulls is not None:
+                mismatch = mismatch | nulls
+        if "totalTax" not in columns:
+            tax = np.zeros(total)
+        elif columns["totalTax"]["kind"] in ("int", "float"):
+            tax = invoices.raw("totalTax")
+        else:
+            tax = np.asarray([v or 0 for v in invoices.column("totalTax")], dtype=np.float64)
+        at_risk = float(np.asarray(tax, dtype=np.float64)[mismatch].sum())
+        mismatches = int(mismatch.sum())
+        return {
+            "period": period,
+            "totalInvoices": total,
+            "totalMismatches": mismatches,
+            "atRiskITC": int(at_risk) if at_risk.is_integer() else at_risk,
+            "matchRate": round((total - mismatches) / total * 100, 1),
+        }
+
+
+# ============================================================
+# Export + prune
+# ============================================================
+class PeriodArchiver:
+    """Exports a closed period to the archive, verifies it, then prunes it from Neo4j and Mongo"""
+
+    def __init__(self, db, driver=None, root=None, ledger=None):
+        from graph_db import get_driver
+        self.db = db
+        self.driver = driver or get_driver()
+        self.root = archive_root(root)
+        # ledger.IngestionLedger to reset on prune (default: the one at INGEST_LEDGER_PATH)
+        self.ledger = ledger
+
+    def _graph_tables(self, period):
+        from graph_db import read_session
+        with read_session(self.driver) as session:
+            invoices = session.run("""
+                MATCH (i:Invoice)-[:REPORTED_IN]->(:GSTR {period: $period})
+                WITH DISTINCT i
+                OPTIONAL MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i)
+                RETURN i.id AS id, v.gstin AS gstin, i.date AS date,
+                       i.taxable_amount AS taxable_amount, i.tax_rate AS tax_rate,
+                       i.igst AS igst, i.cgst AS cgst, i.sgst AS sgst, i.hsn AS hsn,
+                       i.match_status AS match_status
+                ORDER BY id
+            """, period=period).data()
+            filings = session.run("""
+                MATCH (i:Invoice)-[:REPORTED_IN]->(g:GSTR {period: $period})
+                RETURN i.id AS invoice_id, g.type AS return_type
+                ORDER BY invoice_id, return_type
+            """, period=period).data()
+        return invoices, filings
+
+    def export(self, period, reconciliation):
+        """Write the period partition atomically (temp dir + rename); returns its path"""
+        final = _partition(self.root, period)
+        staging = final + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+
+        invoices, filings = self._graph_tables(period)
+        mongo_docs = list(self.db["invoices"].find({"period": period}, {"_id": 0}).sort("id", 1))
+        write_table(os.path.join(staging, "graph_invoices"), invoices)
+        write_table(os.path.join(staging, "filings"), filings)
+        write_table(os.path.join(staging, "mismatches"), reconciliation["mismatches"])
+        write_table(os.path.join(staging, "near_miss_candidates"),
+                    reconciliation.get("near_miss_candidates", []))
+        write_table(os.path.join(staging, "mongo_invoices"), mongo_docs)
+        with open(os.path.join(staging, "_meta.json"), "w") as f:
+            json.dump({
+                "period": period,
+                "total_mismatches": reconciliation["total_mismatches"],
+                "by_type": reconciliation["by_type"],
+                "rows": {"graph_invoices": len(invoices), "filings": len(filings),
+                         "mongo_invoices": len(mongo_docs)},
+                "archived_at": datetime.now().isoformat(),
+            }, f)
+
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(staging, final)
+        return final, invoices, mongo_docs
+
+    def verify(self, period, reconciliation, invoices, mongo_docs):
+        """Raise if the archive would not answer exactly what the hot stores do"""
+        reader = ArchiveReader(self.root)
+        checks = {
+            "reconciliation": (reader.full_reconciliation(period),
+                               {**reconciliation, "near_miss_candidates": reconciliation.get("near_miss_candidates", [])}),
+            "graph_invoices": (reader.table(period, "graph_invoices").records(),
+                               [{k: _plain(v) for k, v in r.items()} for r in invoices]),
+            "mongo_invoices": (reader.table(period, "mongo_invoices").records(), mongo_docs),
+        }
+        for name, (archived, live) in checks.items():
+            if archived != live:
+                raise RuntimeError(f"Archive verification failed for {period}: {name} differs from live data")
+
+    def prune(self, period, batch_size=10000):
+        """
+        Delete the period's invoices (those not filed in any other period) and GSTR nodes, then
+        its Mongo docs; the period's ITC rollups move to the archived rollups, so trend charts
+        keep it. The ingestion ledger forgets the period too, so re-ingesting its files writes
+        them again instead of skipping them as unchanged.
+        """
+        import rollups
+        from graph_db import write_session
+        from ledger import IngestionLedger
+        deleted = 0
+        with write_session(self.driver) as session:
+            while True:
+                count = session.execute_write(self._delete_batch, period=period, batch_size=batch_size)
+                deleted += count
+                if count == 0:
+                    break
+            session.execute_write(lambda tx: tx.run(
+                "MATCH (g:GSTR {period: $period}) DETACH DELETE g", period=period).consume())
+        mongo = self.db["invoices"].delete_many({"period": period}).deleted_count
+        rollups.archive_period(self.db, period)
+        ledger = self.ledger or IngestionLedger()
+        try:
+            ledger_files = ledger.forget_period(period)
+        finally:
+            if ledger is not self.ledger:
+                ledger.close()
+        return {"graph_invoices": deleted, "mongo_invoices": mongo, "ledger_files": ledger_files}
+
+    @staticmethod
+    def _delete_batch(tx, period, batch_size):
+        return tx.run("""
+            MATCH (i:Invoice)-[:REPORTED_IN]->(:GSTR {period: $period})
+            WHERE NOT EXISTS {
+                MATCH (i)-[:REPORTED_IN]->(other:GSTR) WHERE other.period <> $period
+            }
+            WITH DISTINCT i LIMIT $batch_size
+            OPTIONAL MATCH (i)-[:ELECTRONIC_VERSION]->(e:EInvoice)
+            DETACH DELETE e, i
+            RETURN count(DISTINCT i) AS deleted
+        """, period=period, batch_size=batch_size).single()["deleted"]
+
+    def archive(self, period, prune=True):
+        from reconcile import ReconciliationEngine
+        reconciliation = ReconciliationEngine().full_reconciliation(period)
+        path, invoices, mongo_docs = self.export(period, reconciliation)
+        self.verify(period, reconciliation, invoices, mongo_docs)
+        print(f"✅ Archived {period} to {path} ({len(invoices)} graph invoices, {len(mongo_docs)} API invoices)")
+        if prune:
+            removed = self.prune(period)
+            print(f"✅ Pruned {removed['graph_invoices']} invoices from Neo4j, "
+                  f"{removed['mongo_invoices']} from Mongo; ledger reset for {removed['ledger_files']} files")
+        return path
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Archive a closed filing period")
+    parser.add_argument("--period", required=True, help="Closed filing period (YYYY-MM)")
+    parser.add_argument("--no-prune", action="store_true", help="Export and verify only")
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017"))
+    try:
+        PeriodArchiver(client["gst_reconcile_ai"]).archive(args.period, prune=not args.no_prune)
+    finally:
+        client.close()
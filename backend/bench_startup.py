@@ -0,0 +1,97 @@
+"""
+API Startup Benchmark
+Measures time-to-first-request of `uvicorn main:app`: spawn the server, poll `/`
+until it answers, kill it, repeat. With --baseline-ref the same measurement is
+taken on main.py from an older git revision for a before/after comparison.
+
+The current main.py answers `/` without a MongoDB round trip (the client connects
+lazily and rollup indexes are created in a background thread), so it can be timed
+with MongoDB down; older revisions need it reachable at $MONGODB_URI (before the
+lifespan hook, main.py connected and seeded at import time).
+
+Usage:
+    python bench_startup.py --runs 5 --baseline-ref HEAD~1
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import urllib.request
+from io import BytesIO
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(app_dir, timeout=60.0, env=None):
+    """Seconds from process spawn until GET / returns 200"""
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server in {app_dir} exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"server in {app_dir} did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def import_time(app_dir):
+    """Seconds to import main.py in a fresh interpreter"""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=app_dir, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def export_revision(ref, dest, repo_dir):
+    """Extract backend/ at a git revision into dest; returns the backend path"""
+    archive = subprocess.run(["git", "archive", "--format=tar", ref, "backend"],
+                             cwd=repo_dir, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(dest)
+    return os.path.join(dest, "backend")
+
+
+def measure(label, app_dir, runs):
+    first = [time_to_first_request(app_dir) for _ in range(runs)]
+    imports = [import_time(app_dir) for _ in range(runs)]
+    print(f"{label:<10} import main: {statistics.median(imports) * 1000:8.1f} ms   "
+          f"first request: {statistics.median(first) * 1000:8.1f} ms   (median of {runs})")
+    return statistics.median(first)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure API time-to-first-request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline-ref", help="git revision to compare against (e.g. HEAD~1)")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    after = measure("current", here, args.runs)
+    if args.baseline_ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            before = measure(args.baseline_ref, export_revision(args.baseline_ref, tmp, os.path.dirname(here)), args.runs)
+        print(f"✅ Time-to-first-request: {before * 1000:.0f} ms → {after * 1000:.0f} ms "
+              f"({before / after:.1f}x faster)")
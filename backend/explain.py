@@ -4,23 +4,77 @@ Uses LangChain + Neo4j GraphRAG to generate natural-language explanations
 grounded in Knowledge Graph facts.
 """
 
-from langchain_neo4j import Neo4jGraph, GraphCypherQAChain
-from langchain.llms import OpenAI
-from langchain.prompts import PromptTemplate
+from graph_db import SharedDriver, connection_settings, get_driver, read_session
 import os
 
 
+EXPLANATION_TEMPLATE = """You are a GST compliance auditor. Based on the following data from the 
+Knowledge Graph, provide a clear, factual audit explanation.
+
+Question: {question}
+
+Knowledge Graph Data:
+{context}
+
+Provide:
+1. A clear summary of why this invoice is flagged
+2. Specific evidence from the graph data
+3. The relevant CGST Act section
+4. A recommendation for the taxpayer
+
+Use professional but readable language. Cite specific amounts in INR."""
+
+GRAPH_CONTEXT_QUERY = """
+    UNWIND $invoice_ids AS invoice_id
+    MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i:Invoice {id: invoice_id})
+    OPTIONAL MATCH (i)-[:REPORTED_IN]->(g:GSTR)
+    OPTIONAL MATCH (i)-[:ELECTRONIC_VERSION]->(e:EInvoice)
+    OPTIONAL MATCH (i)-[:COVERS_SHIPMENT]->(w:EWayBill)
+    RETURN invoice_id, v, i, collect(DISTINCT g) AS returns,
+           collect(DISTINCT e) AS einvoices,
+           collect(DISTINCT w) AS ewaybills
+"""
+
+INVOICE_SUMMARY_QUERY = """
+    MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i:Invoice {id: $inv_id})
+    OPTIONAL MATCH (i)-[:REPORTED_IN]->(g:GSTR)
+    RETURN v.name AS vendor, v.gstin AS gstin,
+           i.taxable_amount AS amount, i.match_status AS status,
+           collect(g.type + ' (' + g.period + ')') AS filings
+"""
+
+
+def fetch_graph_context(driver, invoice_ids):
+    """Graph context for many invoices in one round trip: {invoice_id: row}"""
+    with read_session(driver) as session:
+        result = session.run(GRAPH_CONTEXT_QUERY, invoice_ids=list(invoice_ids))
+        return {row.pop("invoice_id"): row for row in result.data()}
+
+
 class AuditTrailGenerator:
     """LLM-powered audit trail generator using Knowledge Graph"""
     
-    def __init__(self, neo4j_uri="bolt://localhost:7687", neo4j_user="neo4j", 
-                 neo4j_password="password", openai_api_key=None):
+    def __init__(self, neo4j_uri=None, neo4j_user=None, 
+                 neo4j_password=None, openai_api_key=None):
+        # LangChain is heavy; import it only when the LLM generator is actually built
+        from langchain_neo4j import Neo4jGraph, GraphCypherQAChain
+        from langchain.llms import OpenAI
+        from langchain.prompts import PromptTemplate
         
+        neo4j_uri, neo4j_user, neo4j_password = connection_settings(neo4j_uri, neo4j_user, neo4j_password)
         self.graph = Neo4jGraph(
             url=neo4j_uri,
             username=neo4j_user,
-            password=neo4j_password
+            password=neo4j_password,
+            refresh_schema=False
         )
+        # Reuse the process-wide pool instead of the private one Neo4jGraph opens. Neo4jGraph
+        # closes its driver when it is closed or collected, so it gets a handle whose close()
+        # leaves the shared pool open for the ingester, engine and jobs
+        self.driver = get_driver(neo4j_uri, neo4j_user, neo4j_password)
+        self.graph._driver.close()
+        self.graph._driver = SharedDriver(self.driver)
+        self.graph.refresh_schema()
         
         self.llm = OpenAI(
             model_name="gpt-4",
@@ -50,21 +104,7 @@ Return ONLY the Cypher query, no explanation."""
         
         self.explanation_prompt = PromptTemplate(
             input_variables=["question", "context"],
-            template="""You are a GST compliance auditor. Based on the following data from the 
-Knowledge Graph, provide a clear, factual audit explanation.
-
-Question: {question}
-
-Knowledge Graph Data:
-{context}
-
-Provide:
-1. A clear summary of why this invoice is flagged
-2. Specific evidence from the graph data
-3. The relevant CGST Act section
-4. A recommendation for the taxpayer
-
-Use professional but readable language. Cite specific amounts in INR."""
+            template=EXPLANATION_TEMPLATE
         )
         
         # Build the chain
@@ -111,38 +151,25 @@ Use professional but readable language. Cite specific amounts in INR."""
             "source": "LangChain + Neo4j GraphRAG"
         }
     
-    def get_graph_context(self, invoice_id):
-        """Fetch raw graph context for an invoice (for manual review)"""
-        with self.graph._driver.session() as session:
-            result = session.run("""
-                MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i:Invoice {id: $invoice_id})
-                OPTIONAL MATCH (i)-[:REPORTED_IN]->(g:GSTR)
-                OPTIONAL MATCH (i)-[:ELECTRONIC_VERSION]->(e:EInvoice)
-                OPTIONAL MATCH (i)-[:COVERS_SHIPMENT]->(w:EWayBill)
-                RETURN v, i, collect(DISTINCT g) AS returns, 
-                       collect(DISTINCT e) AS einvoices,
-                       collect(DISTINCT w) AS ewaybills
-            """, invoice_id=invoice_id)
-            return result.data()
+    def get_graph_context(self, invoice_ids):
+        """Fetch raw graph context for one invoice id or a list of them (for manual review)"""
+        if isinstance(invoice_ids, str):
+            row = fetch_graph_context(self.driver, [invoice_ids]).get(invoice_ids)
+            return [row] if row else []
+        return fetch_graph_context(self.driver, invoice_ids)
 
 
 # Simpler alternative using direct Cypher + LLM
 class SimpleAuditTrail:
     """Simplified audit trail without LangChain dependency"""
     
-    def __init__(self, neo4j_driver):
-        self.driver = neo4j_driver
+    def __init__(self, neo4j_driver=None):
+        self.driver = neo4j_driver or get_driver()
     
     def generate_explanation(self, invoice_id):
         """Generate explanation using template"""
-        with self.driver.session() as session:
-            data = session.run("""
-                MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i:Invoice {id: $inv_id})
-                OPTIONAL MATCH (i)-[:REPORTED_IN]->(g:GSTR)
-                RETURN v.name AS vendor, v.gstin AS gstin,
-                       i.taxable_amount AS amount, i.match_status AS status,
-                       collect(g.type + ' (' + g.period + ')') AS filings
-            """, inv_id=invoice_id).single()
+        with read_session(self.driver) as session:
+            data = session.run(INVOICE_SUMMARY_QUERY, inv_id=invoice_id).single()
         
         if not data:
             return f"No data found for invoice {invoice_id}"
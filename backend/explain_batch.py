@@ -0,0 +1,264 @@
+"""
+Batch Audit Explanations
+Generates LLM explanations for many invoices concurrently instead of one blocking
+chain.run() at a time:
+
+- graph context for every invoice is fetched up front with one UNWIND query per chunk
+- at most `concurrency` LLM calls are in flight
+- requests and tokens per minute are kept under the provider's limits
+- 429 / 5xx / network errors are retried with exponential backoff (Retry-After honoured,
+  up to max_backoff)
+- a progress callback fires after every invoice
+
+Talks to any OpenAI-compatible /chat/completions endpoint, so it can be run end to
+end against stub_llm.py.
+
+Usage:
+    python stub_llm.py --port 8009 &
+    python explain_batch.py --period 2025-07 --base-url http://127.0.0.1:8009/v1
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from explain import EXPLANATION_TEMPLATE, fetch_graph_context
+from graph_db import get_driver, read_session
+
+
+class RetryableError(Exception):
+    """Rate limited or transient provider failure; retry_after is in seconds when known"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date); None if unusable"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens"""
+
+    def __init__(self, requests_per_minute=60, tokens_per_minute=90000, window=60.0):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.window = window
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens = 0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now):
+        while self._events and now - self._events[0][0] >= self.window:
+            self._tokens -= self._events.popleft()[1]
+
+    async def acquire(self, tokens):
+        # A single request larger than the whole budget would otherwise wait forever
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if len(self._events) < self.rpm and self._tokens + tokens <= self.tpm:
+                    self._events.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                await asyncio.sleep(self._events[0][0] + self.window - now)
+
+
+class ChatClient:
+    """Minimal OpenAI-compatible chat completions client (stdlib only)"""
+
+    def __init__(self, base_url=None, api_key=None, model="gpt-4", timeout=60.0):
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")).rstrip("/")
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+        self.model = model
+        self.timeout = timeout
+
+    def complete(self, prompt, max_tokens=512):
+        """Blocking call; returns (text, total_tokens)"""
+        body = json.dumps({
+            "model": self.model,
+            "temperature": 0,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }).encode()
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions", data=body, method="POST",
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+                payload = json.load(resp)
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise RetryableError(f"HTTP {e.code}", parse_retry_after(e.headers.get("Retry-After"))) from e
+            raise
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise RetryableError(str(e)) from e
+
+        text = payload["choices"][0]["message"]["content"]
+        usage = payload.get("usage") or {}
+        return text, usage.get("total_tokens") or estimate_tokens(prompt) + estimate_tokens(text)
+
+
+def format_context(row):
+    """Compact, deterministic rendering of one get_graph_context row for the prompt"""
+    if not row:
+        return "No graph data found for this invoice."
+    return json.dumps(row, default=str, sort_keys=True)
+
+
+class BatchExplainer:
+    """Async fan-out of audit explanations with concurrency, rate limits and retries"""
+
+    def __init__(self, driver=None, client=None, concurrency=8, requests_per_minute=60,
+                 tokens_per_minute=90000, max_tokens=512, max_retries=5, backoff=1.0,
+                 max_backoff=30.0, context_batch_size=200, on_progress=None):
+        self.driver = driver
+        self.client = client or ChatClient()
+        self.concurrency = concurrency
+        self.limiter_args = (requests_per_minute, tokens_per_minute)
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.context_batch_size = context_batch_size
+        self.on_progress = on_progress
+
+    def _driver(self):
+        if self.driver is None:
+            self.driver = get_driver()
+        return self.driver
+
+    def fetch_contexts(self, invoice_ids):
+        contexts = {}
+        for start in range(0, len(invoice_ids), self.context_batch_size):
+            contexts.update(fetch_graph_context(self._driver(), invoice_ids[start:start + self.context_batch_size]))
+        return contexts
+
+    def flagged_invoices(self, period, limit=None):
+        """Unmatched invoices of a period, highest tax first"""
+        query = """
+            MATCH (i:Invoice)-[:REPORTED_IN]->(:GSTR {period: $period})
+            WHERE coalesce(i.match_status, 'Matched') <> 'Matched'
+            WITH DISTINCT i
+            RETURN i.id AS id
+            ORDER BY coalesce(i.igst, 0) + coalesce(i.cgst, 0) + coalesce(i.sgst, 0) DESC
+        """ + ("LIMIT $limit" if limit else "")
+        with read_session(self._driver()) as session:
+            result = session.run(query, period=period, limit=limit)
+            return [row["id"] for row in result]
+
+    async def _explain_one(self, invoice_id, context, limiter, semaphore):
+        prompt = EXPLANATION_TEMPLATE.format(
+            question=f"Why is invoice {invoice_id} flagged for ITC risk?",
+            context=format_context(context),
+        )
+        budget = estimate_tokens(prompt) + self.max_tokens
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await limiter.acquire(budget)
+                try:
+                    text, tokens = await asyncio.to_thread(self.client.complete, prompt, self.max_tokens)
+                    return {"invoice_id": invoice_id, "explanation": text, "tokens": tokens,
+                            "attempts": attempt + 1, "source": "Neo4j context + LLM", "model": self.client.model}
+                except RetryableError as e:
+                    if attempt == self.max_retries:
+                        return {"invoice_id": invoice_id, "error": str(e), "attempts": attempt + 1}
+                    # A provider's Retry-After can be minutes or hours; never wait longer than max_backoff
+                    delay = min(e.retry_after or self.backoff * 2 ** attempt, self.max_backoff)
+                    await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                except Exception as e:
+                    return {"invoice_id": invoice_id, "error": f"{type(e).__name__}: {e}", "attempts": attempt + 1}
+
+    async def explain_many(self, invoice_ids, contexts=None):
+        """Explanations in input order; failures carry an `error` key instead of `explanation`"""
+        invoice_ids = list(dict.fromkeys(invoice_ids))
+        if contexts is None:
+            contexts = await asyncio.to_thread(self.fetch_contexts, invoice_ids)
+        limiter = RateLimiter(*self.limiter_args)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = {"completed": 0, "failed": 0, "total": len(invoice_ids)}
+
+        async def run(invoice_id):
+            result = await self._explain_one(invoice_id, contexts.get(invoice_id), limiter, semaphore)
+            done["failed" if "error" in result else "completed"] += 1
+            if self.on_progress:
+                self.on_progress(dict(done), result)
+            return result
+
+        return await asyncio.gather(*(run(i) for i in invoice_ids))
+
+    async def explain_period(self, period, limit=None):
+        invoice_ids = await asyncio.to_thread(self.flagged_invoices, period, limit)
+        return await self.explain_many(invoice_ids)
+
+    def run(self, invoice_ids=None, period=None, limit=None):
+        """Blocking entry point for scripts and job stages"""
+        if period is not None:
+            return asyncio.run(self.explain_period(period, limit))
+        return asyncio.run(self.explain_many(invoice_ids or []))
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Batch LLM audit explanations")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--period", help="Explain every flagged invoice in this period (YYYY-MM)")
+    target.add_argument("--ids", nargs="+", help="Explain these invoice ids")
+    parser.add_argument("--limit", type=int, help="Only the N highest-tax flagged invoices")
+    parser.add_argument("--base-url", help="OpenAI-compatible API base (default: $OPENAI_BASE_URL)")
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=60, help="Requests per minute")
+    parser.add_argument("--tpm", type=int, default=90000, help="Tokens per minute")
+    parser.add_argument("--out", help="Write results as JSON lines to this file")
+    args = parser.parse_args()
+
+    def progress(counts, result):
+        mark = "❌" if "error" in result else "✅"
+        print(f"{mark} [{counts['completed'] + counts['failed']}/{counts['total']}] {result['invoice_id']}")
+
+    explainer = BatchExplainer(
+        client=ChatClient(base_url=args.base_url, model=args.model),
+        concurrency=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+        on_progress=progress,
+    )
+    start = time.perf_counter()
+    results = explainer.run(invoice_ids=args.ids, period=args.period, limit=args.limit)
+    failed = sum("error" in r for r in results)
+    print(f"✅ {len(results) - failed} explained, {failed} failed in {time.perf_counter() - start:.1f}s")
+    if args.out:
+        with open(args.out, "w") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
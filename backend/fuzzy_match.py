@@ -0,0 +1,204 @@
+"""
+Fuzzy Invoice-Number Matching
+Proposes near-miss GSTR-1 ↔ GSTR-2B invoice pairs that exact `Invoice {id}`
+matching misses (prefixes, zero padding, slashes, fiscal-year suffixes).
+
+Candidates are generated per vendor GSTIN from a normalized-key index plus a
+character n-gram inverted index, then filtered by amount and date tolerance.
+Very common n-grams are dropped from the index so each probe touches a bounded
+number of postings and candidate generation stays sub-quadratic.
+"""
+
+import re
+from collections import defaultdict
+from datetime import date, datetime
+
+
+# Fiscal-year suffixes, only when clearly marked: an explicit FY (/FY2425, -FY24-25)
+# or a separated year pair (/24-25, -2024-25, /2024-2025). Bare "2425" is a serial.
+_FY_PATTERN = re.compile(
+    r"(?:[/\-_ ]*FY\s?(?:20)?(\d{2})\s?[-/]?\s?(?:20)?(\d{2})"
+    r"|[/\-_ ]+(?:20)?(\d{2})[-/](?:20)?(\d{2}))$"
+)
+_TOKEN_PATTERN = re.compile(r"[A-Z]+|\d+")
+
+
+def _tokens(invoice_number):
+    """Letter and digit runs of an invoice number, FY suffix removed and zero padding stripped"""
+    text = str(invoice_number or "").upper().strip()
+    fy = _FY_PATTERN.search(text)
+    if fy:
+        start_year, end_year = (g for g in fy.groups() if g is not None)
+        # Only a consecutive year pair is a fiscal year ("INV-2025-10" keeps its serial),
+        # and the serial itself must survive ("INV/24-25" has no other number)
+        if int(end_year) == (int(start_year) + 1) % 100 and re.search(r"\d", text[:fy.start()]):
+            text = text[:fy.start()]
+    return [t.lstrip("0") or "0" if t.isdigit() else t for t in _TOKEN_PATTERN.findall(text)]
+
+
+def normalize_invoice_number(invoice_number):
+    """Canonical form of an invoice number: upper-case, no FY suffix, no zero padding.
+
+    Separators are dropped, except between two numbers: "INV-1-23" and "INV-12-3"
+    are different invoices and keep different keys ("INV1-23", "INV12-3").
+    """
+    key = ""
+    for token in _tokens(invoice_number):
+        if key and token.isdigit() and key[-1].isdigit():
+            key += "-"
+        key += token
+    return key
+
+
+def serial_key(invoice_number):
+    """Blocking key: the trailing numeric token of the invoice number ("INV-2025-10" -> "10")"""
+    digits = [t for t in _tokens(invoice_number) if t.isdigit()]
+    return digits[-1] if digits else ""
+
+
+def ngrams(key, n=3):
+    """Set of padded character n-grams for a normalized key"""
+    padded = f"^{key}$"
+    if len(padded) <= n:
+        return {padded}
+    return {padded[k:k + n] for k in range(len(padded) - n + 1)}
+
+
+def _as_date(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if hasattr(value, "to_native"):  # neo4j.time.Date
+        return value.to_native()
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class FuzzyInvoiceIndex:
+    """Per-GSTIN blocking index over one side of the reconciliation (usually GSTR-1-only invoices)"""
+
+    def __init__(self, ngram_size=3, max_postings=200, min_shared_ngrams=2):
+        self.ngram_size = ngram_size
+        self.max_postings = max_postings
+        self.min_shared_ngrams = min_shared_ngrams
+        self.invoices = []
+        self._by_key = defaultdict(list)      # (gstin, normalized key) -> [row]
+        self._by_serial = defaultdict(list)   # (gstin, serial) -> [row]
+        self._postings = defaultdict(list)    # (gstin, ngram) -> [row]
+
+    def add(self, invoice):
+        """Index an invoice dict with invoice_id, gstin, amount, date (tax optional)"""
+        row = len(self.invoices)
+        key = normalize_invoice_number(invoice["invoice_id"])
+        serial = serial_key(invoice["invoice_id"])
+        self.invoices.append({**invoice, "_key": key, "_serial": serial,
+                              "_date": _as_date(invoice.get("date"))})
+        gstin = invoice["gstin"]
+        self._by_key[(gstin, key)].append(row)
+        if serial:
+            self._by_serial[(gstin, serial)].append(row)
+        for gram in ngrams(key, self.ngram_size):
+            self._postings[(gstin, gram)].append(row)
+
+    def add_all(self, invoices):
+        for invoice in invoices:
+            self.add(invoice)
+        return self
+
+    def _candidate_rows(self, gstin, key, serial):
+        exact = self._by_key.get((gstin, key))
+        if exact:
+            return {row: 1.0 for row in exact}
+
+        grams = ngrams(key, self.ngram_size)
+        shared = defaultdict(int)
+        for gram in grams:
+            postings = self._postings.get((gstin, gram), ())
+            # Stop-grams (e.g. "^IN", "INV") would make every probe linear in the vendor's volume
+            if len(postings) > self.max_postings:
+                continue
+            for row in postings:
+                shared[row] += 1
+
+        candidates = {}
+        for row, count in shared.items():
+            if count < self.min_shared_ngrams:
+                continue
+            other = self.invoices[row]
+            similarity = 2 * count / (len(grams) + len(ngrams(other["_key"], self.ngram_size)))
+            # A different serial number is usually a different invoice, not a typo
+            if serial and other["_serial"] and serial != other["_serial"]:
+                similarity *= 0.5
+            candidates[row] = similarity
+        same_serial = self._by_serial.get((gstin, serial), ()) if serial else ()
+        # Same cap as the n-gram postings: a serial every invoice shares ("1") is no block
+        if len(same_serial) <= self.max_postings:
+            for row in same_serial:
+                candidates[row] = max(candidates.get(row, 0.0), 0.75)
+        return candidates
+
+    def candidates(self, invoice, amount_tolerance=1.0, amount_tolerance_pct=0.01,
+                   date_tolerance_days=7, min_similarity=0.5):
+        """Ranked candidate matches for one invoice from the other side, within amount/date tolerance"""
+        key = normalize_invoice_number(invoice["invoice_id"])
+        serial = serial_key(invoice["invoice_id"])
+        amount = float(invoice.get("amount") or 0)
+        inv_date = _as_date(invoice.get("date"))
+        allowed = max(amount_tolerance, abs(amount) * amount_tolerance_pct)
+
+        ranked = []
+        for row, similarity in self._candidate_rows(invoice["gstin"], key, serial).items():
+            if similarity < min_similarity:
+                continue
+            other = self.invoices[row]
+            amount_diff = abs(amount - float(other.get("amount") or 0))
+            if amount_diff > allowed:
+                continue
+            days_apart = None
+            if inv_date and other["_date"]:
+                days_apart = abs((inv_date - other["_date"]).days)
+                if days_apart > date_tolerance_days:
+                    continue
+            score = similarity * 0.6 + (1 - amount_diff / allowed if allowed else 1) * 0.25
+            score += (1 - (days_apart or 0) / (date_tolerance_days + 1)) * 0.15
+            ranked.append({
+                "invoice_id": other["invoice_id"],
+                "similarity": round(similarity, 3),
+                "amount_difference": round(amount_diff, 2),
+                "days_apart": days_apart,
+                "score": round(score, 4),
+            })
+        ranked.sort(key=lambda c: c["score"], reverse=True)
+        return ranked
+
+
+def propose_matches(missing_in_gstr1, missing_in_gstr2b, **tolerances):
+    """
+    Pair GSTR-2B-only invoices with GSTR-1-only invoices of the same vendor.
+    Returns one-to-one proposals, best score first (greedy assignment).
+    """
+    index = FuzzyInvoiceIndex().add_all(missing_in_gstr2b)
+    proposals = []
+    for invoice in missing_in_gstr1:
+        for candidate in index.candidates(invoice, **tolerances)[:3]:
+            proposals.append({
+                "gstr2b_invoice_id": invoice["invoice_id"],
+                "gstr1_invoice_id": candidate["invoice_id"],
+                "vendor_gstin": invoice["gstin"],
+                **{k: v for k, v in candidate.items() if k != "invoice_id"},
+            })
+
+    proposals.sort(key=lambda p: p["score"], reverse=True)
+    used_2b, used_1, accepted = set(), set(), []
+    for proposal in proposals:
+        if proposal["gstr2b_invoice_id"] in used_2b or proposal["gstr1_invoice_id"] in used_1:
+            continue
+        used_2b.add(proposal["gstr2b_invoice_id"])
+        used_1.add(proposal["gstr1_invoice_id"])
+        accepted.append(proposal)
+    return accepted
@@ -0,0 +1,234 @@
+"""
+Shared Neo4j Driver Factory
+One pooled driver per (uri, user) for the whole process, configured from the
+environment, shared by the ingester, reconciliation engine, risk model and
+audit-trail generators instead of each opening its own pool.
+
+Environment:
+    NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_DATABASE
+    NEO4J_MAX_POOL_SIZE           max connections per server        (default 50)
+    NEO4J_ACQUISITION_TIMEOUT     seconds to wait for a connection   (default 60)
+    NEO4J_MAX_LIFETIME            seconds before a connection is recycled (default 3600)
+    NEO4J_LIVENESS_CHECK          idle seconds before a keep-alive check  (default 30)
+    NEO4J_KEEP_ALIVE              TCP keep-alive on/off               (default 1)
+    NEO4J_WARMUP                  connections to pre-open on creation (default 0)
+
+Usage:
+    python graph_db.py --warmup 5     # connect, warm the pool, print pool stats
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+
+from neo4j import GraphDatabase, READ_ACCESS, WRITE_ACCESS
+
+
+_drivers = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def connection_settings(uri=None, user=None, password=None):
+    return (
+        uri or os.environ.get("NEO4J_URI", "bolt://localhost:7687"),
+        user or os.environ.get("NEO4J_USER", "neo4j"),
+        password or os.environ.get("NEO4J_PASSWORD", "password"),
+    )
+
+
+def driver_config():
+    """Pool and keep-alive options passed to GraphDatabase.driver"""
+    return {
+        "max_connection_pool_size": _env_int("NEO4J_MAX_POOL_SIZE", 50),
+        "connection_acquisition_timeout": _env_int("NEO4J_ACQUISITION_TIMEOUT", 60),
+        "max_connection_lifetime": _env_int("NEO4J_MAX_LIFETIME", 3600),
+        "liveness_check_timeout": _env_int("NEO4J_LIVENESS_CHECK", 30),
+        "keep_alive": os.environ.get("NEO4J_KEEP_ALIVE", "1") != "0",
+    }
+
+
+def database():
+    return os.environ.get("NEO4J_DATABASE") or None
+
+
+def get_driver(uri=None, user=None, password=None, warm_up=None):
+    """Return the process-wide driver for these credentials, creating (and optionally warming) it once"""
+    uri, user, password = connection_settings(uri, user, password)
+    # Different credentials for the same user must not share a pool (digest: no plaintext in the key)
+    key = (uri, user, hashlib.sha256(password.encode()).hexdigest())
+    with _lock:
+        driver = _drivers.get(key)
+        if driver is not None:
+            return driver
+        driver = GraphDatabase.driver(uri, auth=(user, password), **driver_config())
+        _stats[id(driver)] = {"sessions": 0, "active": 0, "max_active": 0, "session_seconds": 0.0,
+                              "max_session_seconds": 0.0, "lock": threading.Lock()}
+        _drivers[key] = driver
+
+    connections = _env_int("NEO4J_WARMUP", 0) if warm_up is None else warm_up
+    if connections:
+        warm(driver, connections)
+    return driver
+
+
+class TimedSession:
+    """
+    Session wrapper that records how long each session is held. The driver exposes no
+    pool metrics, and a session holds a pooled connection while it works, so concurrent
+    sessions near the pool size (and long holds) are what pool pressure looks like.
+    """
+
+    def __init__(self, session, stats):
+        self._session, self._stats = session, stats
+        self._start = time.perf_counter()
+        self._closed = False
+        with stats["lock"]:
+            stats["sessions"] += 1
+            stats["active"] += 1
+            stats["max_active"] = max(stats["max_active"], stats["active"])
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            return self._session.__exit__(*exc)
+        finally:
+            self._record()
+
+    def close(self):
+        try:
+            self._session.close()
+        finally:
+            self._record()
+
+    def _record(self):
+        if self._closed:
+            return
+        self._closed = True
+        elapsed = time.perf_counter() - self._start
+        # Sessions on many threads close concurrently
+        with self._stats["lock"]:
+            self._stats["active"] -= 1
+            self._stats["session_seconds"] += elapsed
+            self._stats["max_session_seconds"] = max(self._stats["max_session_seconds"], elapsed)
+
+
+class SharedDriver:
+    """
+    The process-wide driver, for libraries that close the driver they are handed
+    (LangChain's Neo4jGraph closes it on close() and on garbage collection).
+    close() leaves the shared pool open; close_all() closes it at exit.
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def close(self):
+        pass
+
+
+def _session(driver, access_mode, **kwargs):
+    driver = driver or get_driver()
+    session = driver.session(default_access_mode=access_mode, database=database(), **kwargs)
+    stats = _stats.get(id(driver))
+    return session if stats is None else TimedSession(session, stats)
+
+
+def read_session(driver=None, **kwargs):
+    """Session routed to a reader (followers in a cluster) for session.run() reads"""
+    return _session(driver, READ_ACCESS, **kwargs)
+
+
+def write_session(driver=None, **kwargs):
+    return _session(driver, WRITE_ACCESS, **kwargs)
+
+
+def warm(driver, connections=1):
+    """
+    Verify connectivity and pre-fill the pool with `connections` connections.
+    A session only holds its connection while a transaction is open, so every
+    transaction is begun before any is closed; otherwise one connection is reused N times.
+    """
+    driver.verify_connectivity()
+    sessions, transactions = [], []
+    try:
+        for _ in range(connections):
+            session = read_session(driver)
+            sessions.append(session)
+            tx = session.begin_transaction()
+            transactions.append(tx)
+            tx.run("RETURN 1").consume()
+    finally:
+        for tx in transactions:
+            tx.rollback()
+        for session in sessions:
+            session.close()
+
+
+def pool_stats():
+    """Per-driver session counts and hold times (see TimedSession)"""
+    report = []
+    with _lock:
+        items = list(_drivers.items())
+    for (uri, user, _), driver in items:
+        stats = _stats[id(driver)]
+        with stats["lock"]:
+            sessions, active, max_active, held, max_held = (
+                stats["sessions"], stats["active"], stats["max_active"],
+                stats["session_seconds"], stats["max_session_seconds"])
+        report.append({
+            "uri": uri,
+            "user": user,
+            "max_pool_size": driver_config()["max_connection_pool_size"],
+            "sessions": sessions,
+            "active_sessions": active,
+            "max_active_sessions": max_active,
+            "avg_session_ms": round(held / (sessions - active) * 1000, 3) if sessions > active else 0.0,
+            "max_session_ms": round(max_held * 1000, 3),
+        })
+    return report
+
+
+@atexit.register
+def close_all():
+    with _lock:
+        drivers = list(_drivers.values())
+        _drivers.clear()
+    for driver in drivers:
+        _stats.pop(id(driver), None)
+        driver.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Neo4j connection pool check")
+    parser.add_argument("--uri")
+    parser.add_argument("--warmup", type=int, default=1, help="Connections to pre-open")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    get_driver(uri=args.uri, warm_up=args.warmup)
+    print(f"✅ Driver ready in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(json.dumps(pool_stats(), indent=2))
@@ -0,0 +1,328 @@
+"""
+Background Job Runner
+Runs the heavy pipeline for a filing period (ingest → match → reconcile → re-score → sync)
+in a worker process pool so API request threads never block on it.
+
+Jobs wait in a local in-process queue and are dispatched when a worker slot is free
+and the tenant is below its concurrency limit. Workers report stage progress and
+poll a cancellation flag between stages through a multiprocessing Manager.
+"""
+
+import multiprocessing as mp
+import os
+import threading
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+
+STAGES = ["ingest", "match", "reconcile", "rescore", "sync"]
+TERMINAL_STATES = {"succeeded", "failed", "cancelled"}
+FILE_TYPES = ("GSTR-1", "GSTR-2B", "e-Invoice")
+
+# Jobs may only read files from here; API callers pass paths relative to it
+UPLOAD_DIR = os.path.realpath(os.environ.get(
+    "JOB_UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")))
+
+RISK_LABEL_TO_STATUS = {"Low": "Compliant", "Medium": "Review", "High": "High Risk"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ============================================================
+# Pipeline stages (executed inside worker processes)
+# ============================================================
+def _mongo_db():
+    from pymongo import MongoClient
+    client = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017"))
+    return client, client["gst_reconcile_ai"]
+
+
+def resolve_upload(path, upload_dir=UPLOAD_DIR):
+    """Absolute path of an uploaded file; ValueError if it escapes the upload directory or is missing"""
+    resolved = os.path.realpath(os.path.join(upload_dir, str(path)))
+    if os.path.commonpath([resolved, upload_dir]) != upload_dir:
+        raise ValueError(f"File path {path!r} is outside the upload directory")
+    if not os.path.isfile(resolved):
+        raise ValueError(f"File {path!r} not found in the upload directory")
+    return resolved
+
+
+def validate_files(files, upload_dir=UPLOAD_DIR):
+    """Check job file entries up front so a bad request is a 400, not a failed worker"""
+    validated = []
+    for item in files or []:
+        if not isinstance(item, dict) or "path" not in item:
+            raise ValueError("Each file needs a path and a type")
+        if item.get("type") not in FILE_TYPES:
+            raise ValueError(f"Unknown file type {item.get('type')!r}; expected one of {', '.join(FILE_TYPES)}")
+        validated.append({**item, "path": resolve_upload(item["path"], upload_dir)})
+    return validated
+
+
+def _stage_ingest(spec, context):
+    from ingestion import GSTIngester
+    from ledger import IngestionLedger
+    ledger = IngestionLedger() if spec.get("incremental", True) else None
+    ingester = GSTIngester(ledger=ledger)
+    loaders = {
+        "GSTR-1": lambda item: ingester.ingest_gstr1(item["path"], spec["period"], item.get("filer_gstin")),
+        "GSTR-2B": lambda item: ingester.ingest_gstr2b(item["path"], spec["period"], item.get("recipient_gstin")),
+        "e-Invoice": lambda item: ingester.ingest_einvoice(item["path"]),
+    }
+    try:
+        ingester.ensure_schema()
+        for item in spec.get("files", []):
+            if item["path"].lower().endswith(".csv"):
+                ingester.ingest_csv(item["path"], item["type"], spec["period"], item.get("column_map"),
+                                    recipient_gstin=item.get("recipient_gstin"),
+                                    filer_gstin=item.get("filer_gstin"))
+            else:
+                loaders[item["type"]](item)
+    finally:
+        ingester.close()
+        if ledger is not None:
+            ledger.close()
+    return {"files": len(spec.get("files", []))}
+
+
+def _stage_match(spec, context):
+    from ingestion import GSTIngester
+    ingester = GSTIngester()
+    try:
+        return ingester.run_matching(spec["period"])
+    finally:
+        ingester.close()
+
+
+def _stage_reconcile(spec, context):
+    from reconcile import ReconciliationEngine
+    engine = ReconciliationEngine()
+    try:
+        context["reconciliation"] = engine.full_reconciliation(spec["period"])
+    finally:
+        engine.close()
+    return {
+        "total_mismatches": context["reconciliation"]["total_mismatches"],
+        "by_type": context["reconciliation"]["by_type"],
+    }
+
+
+def _stage_rescore(spec, context):
+    from pymongo import UpdateOne
+    from risk_model import VendorRiskModel
+
+    from vendor_stats import SNAPSHOT_SCORED_INPUTS
+
+    model = VendorRiskModel(model_path=os.environ.get("RISK_MODEL_PATH", "vendor_risk_model.pkl"))
+    # Scoring with a model trained on synthetic data would overwrite real scores with noise
+    if not os.path.exists(model.model_path):
+        return {"skipped": f"no trained model at {model.model_path}"}
+    features = model.extract_features_from_graph()
+    if features.empty:
+        return {"vendors": 0, "updated": 0}
+
+    scores = model.predict_risk(features)
+    client, db = _mongo_db()
+    try:
+        ops = [
+            UpdateOne(
+                {"gstin": gstin, "$or": [{"riskScore": {"$ne": round(prob, 2)}},
+                                         {"status": {"$ne": RISK_LABEL_TO_STATUS[label]}}]},
+                # Snapshot the inputs so vendor_stats only rescores after they move again
+                [{"$set": {"riskScore": round(prob, 2), "status": RISK_LABEL_TO_STATUS[label]}},
+                 SNAPSHOT_SCORED_INPUTS],
+            )
+            for gstin, (prob, label) in zip(features["gstin"], scores)
+        ]
+        written = db["vendors"].bulk_write(ops, ordered=False)
+    finally:
+        client.close()
+    return {"vendors": len(ops), "updated": written.modified_count}
+
+
+def _stage_sync(spec, context):
+    from sync import ReconciliationSync
+    from vendor_stats import classify_risk, predict_risk
+    if "reconciliation" not in context:
+        _stage_reconcile(spec, context)
+    client, db = _mongo_db()
+    try:
+        # Vendors whose aggregates move across a scoring threshold are rescored, as in the API
+        return ReconciliationSync(db, predict_risk, classify_risk).apply(context["reconciliation"])
+    finally:
+        client.close()
+
+
+STAGE_HANDLERS = {
+    "ingest": _stage_ingest,
+    "match": _stage_match,
+    "reconcile": _stage_reconcile,
+    "rescore": _stage_rescore,
+    "sync": _stage_sync,
+}
+
+
+def run_job(job_id, spec, shared):
+    """Worker entry point: run the requested stages in order, checking for cancellation in between"""
+    context, results = {}, {}
+    stages = spec["stages"]
+    for done, stage in enumerate(stages):
+        if shared.get(("cancel", job_id)):
+            raise JobCancelled(stage)
+        shared[("progress", job_id)] = {"stage": stage, "completed": done, "total": len(stages)}
+        results[stage] = STAGE_HANDLERS[stage](spec, context)
+    shared[("progress", job_id)] = {"stage": None, "completed": len(stages), "total": len(stages)}
+    from graph_db import pool_stats
+    results["neo4j_pool"] = pool_stats()
+    return results
+
+
+# ============================================================
+# Queue + dispatcher (lives in the API process)
+# ============================================================
+class JobRunner:
+    """Local job queue feeding a process pool, with per-tenant concurrency limits"""
+
+    def __init__(self, max_workers=None, per_tenant_limit=None):
+        self.max_workers = max_workers or int(os.environ.get("JOB_WORKERS", 2))
+        self.per_tenant_limit = per_tenant_limit or int(os.environ.get("JOB_TENANT_CONCURRENCY", 1))
+        ctx = mp.get_context("spawn")
+        self._manager = ctx.Manager()
+        self._shared = self._manager.dict()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+        # Re-entrant: a done-callback can fire synchronously from inside _dispatch
+        self._lock = threading.RLock()
+        self._queue = deque()
+        self._jobs = {}
+        self._running = {}   # job_id -> tenant
+
+    def submit(self, tenant, period, stages=None, files=None, incremental=True):
+        """Queue a pipeline run for a tenant's period; returns the job record"""
+        stages = stages or STAGES
+        unknown = [s for s in stages if s not in STAGE_HANDLERS]
+        if unknown:
+            raise ValueError(f"Unknown stage(s): {', '.join(unknown)}")
+        files = validate_files(files)
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "tenant": tenant,
+            "period": period,
+            "stages": [s for s in STAGES if s in stages],
+            "files": files,
+            "incremental": incremental,
+            "status": "queued",
+            "cancelRequested": False,
+            "submittedAt": datetime.now().isoformat(),
+            "startedAt": None,
+            "finishedAt": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._queue.append(job["id"])
+        self._dispatch()
+        return self.get(job["id"])
+
+    def _dispatch(self):
+        with self._lock:
+            for job_id in list(self._queue):
+                if len(self._running) >= self.max_workers:
+                    break
+                if job_id not in self._queue:
+                    continue
+                job = self._jobs[job_id]
+                tenant_running = sum(1 for t in self._running.values() if t == job["tenant"])
+                if tenant_running >= self.per_tenant_limit:
+                    continue
+                self._queue.remove(job_id)
+                self._running[job_id] = job["tenant"]
+                job["status"] = "running"
+                job["startedAt"] = datetime.now().isoformat()
+                spec = {"period": job["period"], "stages": job["stages"], "files": job["files"],
+                        "incremental": job["incremental"]}
+                future = self._executor.submit(run_job, job_id, spec, self._shared)
+                future.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
+
+    def _finished(self, job_id, future):
+        try:
+            progress = self._shared.get(("progress", job_id))
+        except (EOFError, OSError):
+            progress = None  # Manager already shut down
+        with self._lock:
+            job = self._jobs[job_id]
+            self._running.pop(job_id, None)
+            job["finishedAt"] = datetime.now().isoformat()
+            job["progress"] = progress
+            # Futures cancelled by shutdown() have no exception to ask for
+            error = None if future.cancelled() else future.exception()
+            if future.cancelled() or isinstance(error, JobCancelled):
+                job["status"] = "cancelled"
+            elif error is None:
+                job["status"] = "succeeded"
+                job["result"] = future.result()
+            else:
+                job["status"] = "failed"
+                job["error"] = "".join(traceback.format_exception_only(type(error), error)).strip()
+        # The final progress lives on the job now; the Manager dict only holds running jobs
+        self._forget_shared(job_id)
+        self._dispatch()
+
+    def _forget_shared(self, job_id):
+        try:
+            self._shared.pop(("progress", job_id), None)
+            self._shared.pop(("cancel", job_id), None)
+        except (EOFError, OSError):
+            pass
+
+    def get(self, job_id):
+        """Job record merged with the worker's latest progress, or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        if job["status"] in TERMINAL_STATES:
+            progress = job.get("progress")
+        else:
+            progress = self._shared.get(("progress", job_id))
+        job["progress"] = progress or {"stage": None, "completed": 0, "total": len(job["stages"])}
+        return job
+
+    def list(self, tenant=None):
+        with self._lock:
+            ids = [j["id"] for j in self._jobs.values() if tenant is None or j["tenant"] == tenant]
+        return [self.get(job_id) for job_id in ids]
+
+    def cancel(self, job_id):
+        """
+        Drop a queued job ("cancelled"), or ask a running one to stop before its next
+        stage ("requested" — it may still finish if its last stage is under way).
+        Returns None for unknown or already finished jobs.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATES:
+                return None
+            if job_id in self._queue:
+                self._queue.remove(job_id)
+                job["status"] = "cancelled"
+                job["finishedAt"] = datetime.now().isoformat()
+                return "cancelled"
+            job["cancelRequested"] = True
+        self._shared[("cancel", job_id)] = True
+        with self._lock:
+            finished = job["status"] in TERMINAL_STATES
+        if finished:
+            # _finished may have cleaned up before the flag was set; it would leak
+            self._forget_shared(job_id)
+        return "requested"
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
@@ -0,0 +1,146 @@
+"""
+Ingestion Ledger
+Remembers what each GSTR file load wrote so re-runs only touch what changed.
+
+Everything is kept per (return type, period, GSTIN), where the GSTIN is the
+taxpayer who filed the return: the supplier for GSTR-1, the recipient for
+GSTR-2B. Per GSTIN it keeps the SHA-256 of the last file loaded for it, and per
+invoice a hash of the record's fields. A re-sent file that is byte-identical is
+skipped outright; otherwise only added, changed and removed invoices are
+written to the graph, and a file only ever removes invoices of the GSTINs it
+covers.
+
+Stored in a local SQLite file (INGEST_LEDGER_PATH, default ingestion_ledger.db).
+"""
+
+import hashlib
+import os
+import sqlite3
+from collections import Counter
+from datetime import datetime
+
+
+def file_sha256(filepath, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_hash(record):
+    """Stable hash of a record tuple (field order is fixed by the caller)"""
+    return hashlib.blake2b(repr(record).encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Bumped when the tables or what they are keyed by change; an older ledger is dropped, which costs one full reload
+SCHEMA_VERSION = 3
+
+
+class IngestionLedger:
+    """SQLite-backed file and record hashes for incremental re-ingestion"""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("INGEST_LEDGER_PATH", "ingestion_ledger.db")
+        self.conn = sqlite3.connect(self.path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.conn.executescript(f"""
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS records;
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                return_type TEXT NOT NULL,
+                period      TEXT NOT NULL,
+                gstin       TEXT NOT NULL,
+                sha256      TEXT NOT NULL,
+                gstins      INTEGER NOT NULL,
+                records     INTEGER NOT NULL,
+                ingested_at TEXT NOT NULL,
+                PRIMARY KEY (return_type, period, gstin)
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                return_type TEXT NOT NULL,
+                period      TEXT NOT NULL,
+                gstin       TEXT NOT NULL,
+                party_gstin TEXT NOT NULL,
+                invoice_id  TEXT NOT NULL,
+                record_hash TEXT NOT NULL,
+                PRIMARY KEY (return_type, period, gstin, party_gstin, invoice_id)
+            );
+            CREATE INDEX IF NOT EXISTS records_by_invoice
+                ON records (return_type, period, party_gstin, invoice_id);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def is_unchanged(self, return_type, period, sha256):
+        """
+        True if this exact file was the last one loaded for every GSTIN it covered.
+        Looked up by content, so it is answered before the file is parsed.
+        """
+        covered, gstins = self.conn.execute(
+            "SELECT COUNT(*), MAX(gstins) FROM files WHERE return_type = ? AND period = ? AND sha256 = ?",
+            (return_type, period, sha256),
+        ).fetchone()
+        return covered > 0 and covered == gstins
+
+    def diff(self, return_type, period, records):
+        """
+        Compare {(gstin, party_gstin, invoice_id): hash} against the ledger.
+        Removals are only reported for GSTINs present in `records`, so a file
+        covering a few taxpayers never retracts anyone else's invoices.
+        Returns (upserts, removals) as lists of (gstin, party_gstin, invoice_id).
+        """
+        previous = {}
+        for gstin in {key[0] for key in records}:
+            for party_gstin, invoice_id, digest in self.conn.execute(
+                "SELECT party_gstin, invoice_id, record_hash FROM records "
+                "WHERE return_type = ? AND period = ? AND gstin = ?",
+                (return_type, period, gstin),
+            ):
+                previous[(gstin, party_gstin, invoice_id)] = digest
+
+        upserts = [key for key, digest in records.items() if previous.get(key) != digest]
+        removals = [key for key in previous if key not in records]
+        return upserts, removals
+
+    def unshared(self, return_type, period, removals):
+        """Removals whose invoice no other GSTIN still reports for the period (safe to retract)"""
+        return [
+            (gstin, party_gstin, invoice_id) for gstin, party_gstin, invoice_id in removals
+            if self.conn.execute(
+                "SELECT 1 FROM records WHERE return_type = ? AND period = ? AND party_gstin = ? "
+                "AND invoice_id = ? AND gstin <> ? LIMIT 1",
+                (return_type, period, party_gstin, invoice_id, gstin),
+            ).fetchone() is None
+        ]
+
+    def commit(self, return_type, period, sha256, records, upserts, removals):
+        """Record a successful load; call only after the graph writes went through"""
+        per_gstin = Counter(key[0] for key in records)
+        now = datetime.now().isoformat()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                [(return_type, period, *key, records[key]) for key in upserts],
+            )
+            self.conn.executemany(
+                "DELETE FROM records WHERE return_type = ? AND period = ? "
+                "AND gstin = ? AND party_gstin = ? AND invoice_id = ?",
+                [(return_type, period, *key) for key in removals],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(return_type, period, gstin, sha256, len(per_gstin), count, now)
+                 for gstin, count in per_gstin.items()],
+            )
+
+    def forget_period(self, period):
+        """Drop everything recorded for a period (e.g. once it is pruned); returns the file rows removed"""
+        with self.conn:
+            self.conn.execute("DELETE FROM records WHERE period = ?", (period,))
+            return self.conn.execute("DELETE FROM files WHERE period = ?", (period,)).rowcount
@@ -3,22 +3,46 @@ GST ReconcileAI - MongoDB-Backed FastAPI Backend
 All data persisted in MongoDB. Frontend fetches and posts via REST API.
 """
 
-from fastapi import FastAPI, Query, Body
+from fastapi import FastAPI, Query, Body, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 from bson import ObjectId
-import json, os
+from contextlib import asynccontextmanager
+import importlib, json, os, threading
 from datetime import datetime
 from dotenv import load_dotenv
+import rollups, vendor_stats
+# Heuristic risk score (same logic as frontend), shared with the sync and job workers
+from vendor_stats import classify_risk, predict_risk
+from responses import json_response
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app):
+    """Connect (and optionally seed / warm up) after import, so workers start serving fast"""
+    connect_db()
+    if os.environ.get("SEED_ON_STARTUP", "0") == "1":
+        seed_data()
+    warmup = [m.strip() for m in os.environ.get("WARMUP_MODULES", "").split(",") if m.strip()]
+    # MongoClient connects lazily, so nothing above waits on the network unless seeding
+    threading.Thread(target=background_startup, args=(warmup,), daemon=True).start()
+    yield
+    if _job_runner is not None:
+        _job_runner.shutdown()
+    if client is not None:
+        client.close()
+
+
 app = FastAPI(
     title="GST ReconcileAI API",
     description="Knowledge Graph-powered GST Reconciliation Engine with MongoDB",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -33,30 +57,60 @@ app.add_middleware(
 # MongoDB Connection
 # ============================================================
 MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGODB_URI)
-db = client["gst_reconcile_ai"]
-vendors_col = db["vendors"]
-invoices_col = db["invoices"]
-alerts_col = db["alerts"]
-users_col = db["users"]
+client = db = None
+vendors_col = invoices_col = alerts_col = users_col = None
+
+def connect_db():
+    """Create the Mongo client and collection handles (called from the lifespan hook)"""
+    global client, db, vendors_col, invoices_col, alerts_col, users_col
+    if client is not None:
+        return
+    client = MongoClient(MONGODB_URI)
+    db = client["gst_reconcile_ai"]
+    vendors_col = db["vendors"]
+    invoices_col = db["invoices"]
+    alerts_col = db["alerts"]
+    users_col = db["users"]
 
-def serialize(doc):
-    """Convert MongoDB document to JSON-safe dict"""
-    if doc is None:
-        return None
-    if "_id" in doc:
-        doc["_id"] = str(doc["_id"])
-    return doc
 
-def serialize_list(cursor):
-    return [serialize(doc) for doc in cursor]
+# ============================================================
+# Heavy modules (pandas/sklearn/langchain) load on first use
+# ============================================================
+_modules = {}
+_modules_lock = threading.Lock()
+
+def lazy_module(name):
+    """Import a backend module on first use and cache it"""
+    module = _modules.get(name)
+    if module is None:
+        with _modules_lock:
+            module = _modules.get(name) or importlib.import_module(name)
+            _modules[name] = module
+    return module
+
+def warm_up_modules(names):
+    for name in names:
+        try:
+            lazy_module(name)
+            print(f"[OK] Warmed up {name}")
+        except ImportError as e:
+            print(f"[WARN] Could not warm up {name}: {e}")
+
+def background_startup(modules):
+    """Startup work the first request must not wait for: rollup indexes, then module warm-up"""
+    try:
+        rollups.ensure_indexes(db)
+    except PyMongoError as e:
+        print(f"[WARN] Could not create rollup indexes: {e}")
+    warm_up_modules(modules)
 
 
 # ============================================================
-# Seed default data if collections are empty
+# Seed default data if collections are empty (SEED_ON_STARTUP=1)
 # ============================================================
 def seed_data():
-    if vendors_col.count_documents({}) == 0:
+    # estimated_document_count reads collection metadata instead of scanning
+    if vendors_col.estimated_document_count() == 0:
         default_vendors = [
             {"id":"V001","name":"Tata Steel Ltd","gstin":"29AABCU9603R1ZM","state":"Karnataka","riskScore":0.12,"status":"Compliant","totalTransactions":245,"missedFilings":0,"avgDaysLate":0},
             {"id":"V002","name":"Reliance Industries","gstin":"27AABCR9718E1ZL","state":"Maharashtra","riskScore":0.08,"status":"Compliant","totalTransactions":312,"missedFilings":0,"avgDaysLate":0},
@@ -82,7 +136,7 @@ def seed_data():
         vendors_col.insert_many(default_vendors)
         print("[OK] Seeded 20 vendors")
 
-    if invoices_col.count_documents({}) == 0:
+    if invoices_col.estimated_document_count() == 0:
         default_invoices = [
             {"id":"INV-2025-001","vendorId":"V005","vendorName":"Hyderabad Steels Pvt","gstin":"36AAACH7409R1ZK","date":"2025-07-15","taxableAmount":450000,"cgst":40500,"sgst":40500,"igst":0,"totalTax":81000,"total":531000,"hsn":"7208","period":"2025-07","gstr1Reported":False,"gstr2bReported":True,"eInvoice":True,"eWayBill":True,"matchStatus":"Missing in GSTR-1","riskLevel":"High"},
             {"id":"INV-2025-002","vendorId":"V001","vendorName":"Tata Steel Ltd","gstin":"29AABCU9603R1ZM","date":"2025-07-18","taxableAmount":780000,"cgst":70200,"sgst":70200,"igst":0,"totalTax":140400,"total":920400,"hsn":"7210","period":"2025-07","gstr1Reported":True,"gstr2bReported":True,"eInvoice":True,"eWayBill":True,"matchStatus":"Matched","riskLevel":"Low"},
@@ -106,16 +160,17 @@ def seed_data():
             {"id":"INV-2025-020","vendorId":"V004","vendorName":"Wipro Limited","gstin":"29AABCW6273R1ZA","date":"2025-09-15","taxableAmount":890000,"cgst":80100,"sgst":80100,"igst":0,"totalTax":160200,"total":1050200,"hsn":"9983","period":"2025-09","gstr1Reported":True,"gstr2bReported":True,"eInvoice":True,"eWayBill":False,"matchStatus":"Matched","riskLevel":"Low"},
         ]
         invoices_col.insert_many(default_invoices)
+        rollups.rebuild(db)
         print("[OK] Seeded 20 invoices")
 
-    if users_col.count_documents({}) == 0:
+    if users_col.estimated_document_count() == 0:
         users_col.insert_many([
             {"email":"admin@gstreconcile.ai","password":"admin123","name":"Admin User","role":"admin","createdAt":"2025-01-01"},
             {"email":"auditor@gstreconcile.ai","password":"auditor123","name":"Tax Auditor","role":"auditor","createdAt":"2025-03-15"},
         ])
         print("[OK] Seeded default users")
 
-    if alerts_col.count_documents({}) == 0:
+    if alerts_col.estimated_document_count() == 0:
         alerts_col.insert_many([
             {"type":"critical","message":"5 invoices missing from vendor GSTR-1 filings","time":"2 hours ago","icon":"🔴"},
             {"type":"warning","message":"Vendor V005 risk score increased to 78%","time":"5 hours ago","icon":"🟡"},
@@ -126,29 +181,6 @@ def seed_data():
         print("[OK] Seeded alerts")
 
 
-# Run seed on startup
-seed_data()
-
-
-# ============================================================
-# Risk prediction (same logic as frontend)
-# ============================================================
-def predict_risk(vendor_data):
-    missed = min(vendor_data.get("missedFilings", 0) / 6, 1)
-    late = min(vendor_data.get("avgDaysLate", 0) / 20, 1)
-    tx = vendor_data.get("totalTransactions", 100)
-    tx_score = 0.8 if tx < 50 else (0.4 if tx < 100 else 0.1)
-    einv = 0.7 if vendor_data.get("missedFilings", 0) > 2 else 0.2
-
-    score = missed * 0.28 + late * 0.22 + tx_score * 0.12 + einv * 0.12 + 0.3 * 0.08
-    return min(max(score, 0.05), 0.95)
-
-def classify_risk(score):
-    if score >= 0.6: return "High Risk"
-    if score >= 0.3: return "Review"
-    return "Compliant"
-
-
 # ============================================================
 # API Endpoints
 # ============================================================
@@ -160,9 +192,8 @@ def root():
 
 # ---- Vendors ----
 @app.get("/api/vendors")
-def get_vendors():
-    vendors = serialize_list(vendors_col.find({}, {"_id": 0}))
-    return vendors
+def get_vendors(request: Request):
+    return json_response(request, list(vendors_col.find({}, {"_id": 0})))
 
 @app.post("/api/vendors")
 def add_vendor(vendor: dict = Body(...)):
@@ -182,6 +213,7 @@ def add_vendor(vendor: dict = Body(...)):
         "missedFilings": vendor.get("missedFilings", 0),
         "avgDaysLate": vendor.get("avgDaysLate", 0),
     }
+    new_vendor["scoredOn"] = vendor_stats.scored_inputs(new_vendor)
     vendors_col.insert_one(new_vendor.copy())
     
     # Add alert
@@ -199,15 +231,10 @@ def add_vendor(vendor: dict = Body(...)):
 
 # ---- Invoices ----
 @app.get("/api/invoices")
-def get_invoices():
-    invoices = serialize_list(invoices_col.find({}, {"_id": 0}))
-    return invoices
+def get_invoices(request: Request):
+    return json_response(request, list(invoices_col.find({}, {"_id": 0})))
 
-@app.post("/api/invoices")
-def add_invoice(invoice: dict = Body(...)):
-    count = invoices_col.count_documents({})
-    inv_id = f"INV-2025-{str(count + 1).zfill(3)}"
-    
+def build_invoice(invoice, inv_id, vendor):
     # Determine match status
     gstr1 = invoice.get("gstr1Reported", True)
     gstr2b = invoice.get("gstr2bReported", True)
@@ -228,10 +255,7 @@ def add_invoice(invoice: dict = Body(...)):
     if match_status != "Matched":
         risk_level = "High" if total_tax > 50000 else "Medium"
     
-    # Find vendor
-    vendor = vendors_col.find_one({"id": invoice.get("vendorId")}, {"_id": 0})
-    
-    new_invoice = {
+    return {
         "id": inv_id,
         "vendorId": invoice.get("vendorId", ""),
         "vendorName": vendor["name"] if vendor else "Unknown",
@@ -247,12 +271,40 @@ def add_invoice(invoice: dict = Body(...)):
         "period": invoice.get("period", ""),
         "gstr1Reported": gstr1,
         "gstr2bReported": gstr2b,
+        "gstr1FiledDate": invoice.get("gstr1FiledDate", ""),
         "eInvoice": invoice.get("eInvoice", True),
         "eWayBill": invoice.get("eWayBill", True),
         "matchStatus": match_status,
         "riskLevel": risk_level,
     }
+
+def rescore_alerts(rescored):
+    """One alert per vendor whose risk status changed after its aggregates moved"""
+    return [
+        {
+            "type": "critical" if v["status"] == "High Risk" else ("warning" if v["status"] == "Review" else "success"),
+            "message": f"Vendor {v['name']} rescored — Risk: {int(v['riskScore'] * 100)}% ({v['previousStatus']} → {v['status']})",
+            "time": "Just now",
+            "icon": "🔴" if v["status"] == "High Risk" else ("🟡" if v["status"] == "Review" else "🟢"),
+        }
+        for v in rescored if v["status"] != v["previousStatus"]
+    ]
+
+@app.post("/api/invoices")
+def add_invoice(invoice: dict = Body(...)):
+    count = invoices_col.count_documents({})
+    inv_id = f"INV-2025-{str(count + 1).zfill(3)}"
+    
+    # Find vendor
+    vendor = vendors_col.find_one({"id": invoice.get("vendorId")}, {"_id": 0})
+    
+    new_invoice = build_invoice(invoice, inv_id, vendor)
+    match_status = new_invoice["matchStatus"]
+    risk_level = new_invoice["riskLevel"]
+    total_tax = new_invoice["totalTax"]
     invoices_col.insert_one(new_invoice.copy())
+    rollups.record_invoices(db, [new_invoice])
+    rescored = vendor_stats.record_invoices(db, [new_invoice], predict_risk, classify_risk)
     
     # Add alert
     if match_status != "Matched":
@@ -269,16 +321,46 @@ def add_invoice(invoice: dict = Body(...)):
             "time": "Just now",
             "icon": "🟢",
         }
-    alerts_col.insert_one(alert.copy())
+    alerts_col.insert_many([alert.copy()] + rescore_alerts(rescored))
     
-    return {"invoice": new_invoice, "alert": alert}
+    return {"invoice": new_invoice, "alert": alert, "rescoredVendors": rescored}
+
+@app.post("/api/invoices/bulk")
+def add_invoices_bulk(invoices: List[dict] = Body(...)):
+    """Insert many invoices with one write per collection, then refresh the touched vendors"""
+    if not invoices:
+        return {"inserted": 0, "mismatches": 0, "rescoredVendors": []}
+    count = invoices_col.count_documents({})
+    vendor_ids = list({inv.get("vendorId") for inv in invoices if inv.get("vendorId")})
+    vendors = {v["id"]: v for v in vendors_col.find({"id": {"$in": vendor_ids}}, {"_id": 0, "id": 1, "name": 1, "gstin": 1})}
+
+    new_invoices = [
+        build_invoice(inv, f"INV-2025-{str(count + n + 1).zfill(3)}", vendors.get(inv.get("vendorId")))
+        for n, inv in enumerate(invoices)
+    ]
+    invoices_col.insert_many([inv.copy() for inv in new_invoices], ordered=False)
+    rollups.record_invoices(db, new_invoices)
+    rescored = vendor_stats.record_invoices(db, new_invoices, predict_risk, classify_risk)
+
+    mismatches = sum(inv["matchStatus"] != "Matched" for inv in new_invoices)
+    alerts = rescore_alerts(rescored)
+    if mismatches:
+        alerts.append({
+            "type": "warning",
+            "message": f"Bulk load: {mismatches} of {len(new_invoices)} invoices need reconciliation",
+            "time": "Just now",
+            "icon": "🟡",
+        })
+    if alerts:
+        alerts_col.insert_many(alerts)
+
+    return {"inserted": len(new_invoices), "mismatches": mismatches, "rescoredVendors": rescored}
 
 
 # ---- Alerts ----
 @app.get("/api/alerts")
-def get_alerts():
-    alerts = serialize_list(alerts_col.find({}, {"_id": 0}).sort("_id", -1).limit(20))
-    return alerts
+def get_alerts(request: Request):
+    return json_response(request, list(alerts_col.find({}, {"_id": 0}).sort("_id", -1).limit(20)))
 
 
 # ---- Auth ----
@@ -312,6 +394,96 @@ def api_predict_risk(features: dict = Body(...)):
     return {"score": round(score, 4), "status": status}
 
 
+# ---- Background Jobs ----
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+def job_runner():
+    """Process-pool job runner, started on first use so plain API workers never spawn it"""
+    global _job_runner
+    if _job_runner is None:
+        # Two concurrent first requests must not each start a pool and a Manager
+        with _job_runner_lock:
+            if _job_runner is None:
+                _job_runner = lazy_module("jobs").JobRunner()
+    return _job_runner
+
+@app.post("/api/jobs")
+def create_job(spec: dict = Body(...)):
+    if not spec.get("period"):
+        raise HTTPException(status_code=400, detail="period is required")
+    try:
+        job = job_runner().submit(
+            tenant=spec.get("tenant", "default"),
+            period=spec["period"],
+            stages=spec.get("stages"),
+            files=spec.get("files"),
+            incremental=spec.get("incremental", True),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job
+
+@app.get("/api/jobs")
+def list_jobs(tenant: Optional[str] = None):
+    return job_runner().list(tenant)
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_runner().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    if job_runner().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    outcome = job_runner().cancel(job_id)
+    # A running job is only asked to stop; it may still finish its current stage and succeed
+    return {"cancelled": outcome == "cancelled", "cancelRequested": outcome == "requested",
+            "job": job_runner().get(job_id)}
+
+
+# ---- ITC Rollups (period x vendor x status) ----
+@app.get("/api/rollups/itc")
+def get_itc_rollups(
+    period_from: Optional[str] = Query(None, alias="from"),
+    period_to: Optional[str] = Query(None, alias="to"),
+    vendorId: Optional[str] = None,
+    matchStatus: Optional[str] = None,
+    groupBy: str = "period",
+):
+    try:
+        return rollups.query(db, period_from, period_to, vendorId, matchStatus, tuple(groupBy.split(",")))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/rollups/rebuild")
+def rebuild_rollups():
+    return {"rows": rollups.rebuild(db)}
+
+
+# ---- Archived Periods ----
+def archive_reader(period=None):
+    reader = lazy_module("archive").ArchiveReader()
+    if period is not None and not reader.has(period):
+        raise HTTPException(status_code=404, detail=f"Period {period} is not archived")
+    return reader
+
+@app.get("/api/archive/periods")
+def archived_periods():
+    return archive_reader().periods()
+
+@app.get("/api/archive/{period}/stats")
+def archived_stats(period: str):
+    return archive_reader(period).stats(period)
+
+@app.get("/api/archive/{period}/reconciliation")
+def archived_reconciliation(period: str):
+    return archive_reader(period).full_reconciliation(period)
+
+
 # ---- Dashboard Stats ----
 @app.get("/api/stats")
 def get_stats():
@@ -0,0 +1,359 @@
+"""
+Cypher Query Profiler
+Runs every named query from reconcile.py, ingestion.py, risk_model.py and
+explain.py under PROFILE against a generated dataset and records, per operator,
+db hits, rows and time. Results are diffed against a stored baseline: a query
+that gains a label scan, an all-nodes scan or a cartesian product is flagged
+(exit code 1), as is a large jump in total db hits.
+
+Write queries are profiled inside a transaction that is rolled back, so every
+query sees the same dataset.
+
+profile_baseline.json is not checked in: db hits depend on the Neo4j version and
+the dataset size, so record it with the same --image, --vendors and --invoices
+that later runs compare with (the defaults, unless there is a reason not to).
+Without a baseline the report is printed and nothing is flagged.
+
+Usage:
+    python profile_queries.py --start-neo4j --update-baseline   # record a baseline
+    python profile_queries.py --start-neo4j                     # compare against it
+    python profile_queries.py --uri bolt://localhost:7687 --reset --invoices 50000
+"""
+
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+from graph_db import get_driver, read_session, write_session
+from ingestion import GSTIngester, LEDGER_FIELDS
+
+
+PERIOD = "2025-07"
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile_baseline.json")
+
+# Operators that mean a query is no longer anchored on an index / relationship expansion
+FLAGGED_OPERATORS = {"AllNodesScan", "NodeByLabelScan", "CartesianProduct"}
+DB_HITS_TOLERANCE = 0.25
+EINVOICE_FIELDS = ("invoice_id", "irn", "ack_date", "status")
+
+
+# ============================================================
+# Named queries
+# ============================================================
+def named_queries(dataset):
+    """{name: (cypher, params, is_write)} for every query the backend runs"""
+    import explain
+    import ingestion
+    import reconcile
+
+    ids = dataset["sample_invoice_ids"]
+    batch = dataset["sample_batches"]
+    # The per-record JSON loaders write one row per transaction: profile one sample row
+    record = {return_type: {field: values[0] for field, values in columns.items()}
+              for return_type, columns in batch.items()}
+    queries = {
+        "reconcile.missing_in_gstr1": (reconcile.MISSING_IN_GSTR1_QUERY, {"period": PERIOD}, False),
+        "reconcile.tax_mismatch": (reconcile.TAX_MISMATCH_QUERY, {"period": PERIOD}, False),
+        "reconcile.hsn_mismatch": (reconcile.HSN_MISMATCH_QUERY, {"period": PERIOD}, False),
+        "reconcile.missing_eway_bill": (reconcile.MISSING_EWAY_BILL_QUERY, {"period": PERIOD}, False),
+        "reconcile.one_sided_invoices": (reconcile.ONE_SIDED_INVOICES_QUERY,
+                                         {"period": PERIOD, "filed": "GSTR-2B", "missing": "GSTR-1"}, False),
+        "ingestion.pending_status_changes": (ingestion.PENDING_STATUS_CHANGES_QUERY,
+                                             {"period": PERIOD, "after": "", "limit": 10000}, False),
+        "ingestion.link_matches": (ingestion.LINK_MATCHES_QUERY, {"period": PERIOD, "ids": ids}, True),
+        "ingestion.mark_unmatched": (ingestion.MARK_UNMATCHED_QUERY,
+                                     {"period": PERIOD, "rows": [{"id": i, "status": "Missing in GSTR-1"} for i in ids]},
+                                     True),
+        "ingestion.retract_records": (ingestion.RETRACT_RECORDS_QUERY,
+                                      {"return_type": "GSTR-1", "period": PERIOD, "ids": ids}, True),
+        "ingestion.gstr1_batch": (ingestion.GSTR1_BATCH_QUERY, {"period": PERIOD, **batch["GSTR-1"]}, True),
+        "ingestion.gstr2b_batch": (ingestion.GSTR2B_BATCH_QUERY, {"period": PERIOD, **batch["GSTR-2B"]}, True),
+        "ingestion.einvoice_batch": (ingestion.EINVOICE_BATCH_QUERY, batch["e-Invoice"], True),
+        "ingestion.gstr1_record": (ingestion.GSTR1_RECORD_QUERY, {"period": PERIOD, **record["GSTR-1"]}, True),
+        "ingestion.gstr2b_record": (ingestion.GSTR2B_RECORD_QUERY, {"period": PERIOD, **record["GSTR-2B"]}, True),
+        "ingestion.einvoice_record": (ingestion.EINVOICE_RECORD_QUERY, record["e-Invoice"], True),
+        "explain.graph_context": (explain.GRAPH_CONTEXT_QUERY, {"invoice_ids": ids}, False),
+        "explain.invoice_summary": (explain.INVOICE_SUMMARY_QUERY, {"inv_id": ids[0]}, False),
+    }
+    # risk_model imports pandas and scikit-learn; without them its query is left out of the run
+    try:
+        import risk_model
+    except ImportError as e:
+        print(f"⚠️  Skipping risk_model.vendor_features: {e}")
+    else:
+        queries["risk_model.vendor_features"] = (risk_model.VENDOR_FEATURES_QUERY, {}, False)
+    return queries
+
+
+# ============================================================
+# Dataset
+# ============================================================
+def _columns(rows, fields):
+    return {field: list(values) for field, values in zip(fields, zip(*rows))}
+
+
+def generate_dataset(ingester, vendors=500, invoices=20000, batch_size=5000, seed=7):
+    """
+    Load a deterministic synthetic period through the real batch writers:
+    ~90% of invoices in both returns, ~5% only in GSTR-2B, ~5% only in GSTR-1,
+    half with an e-Invoice, ~1% re-filed with a different HSN.
+    """
+    rng = random.Random(seed)
+    gstins = [f"{rng.randint(1, 37):02d}AABC{n:05d}Z{rng.randint(1, 9)}Z{rng.choice('ABCDEFGH')}" for n in range(vendors)]
+    recipient = gstins[0]
+    gstr1, gstr2b, einv = [], [], []
+    for n in range(invoices):
+        seller = gstins[rng.randrange(1, vendors)]
+        invoice_id = f"INV-{n:07d}"
+        date = f"{PERIOD}-{rng.randint(1, 28):02d}"
+        value = float(rng.choice([rng.randint(1000, 50000), rng.randint(50001, 500000)]))
+        tax = round(value * 0.09, 2)
+        hsn = rng.choice(["7208", "8471", "9983", "3004", "8703"])
+        roll = rng.random()
+        if roll >= 0.05:
+            gstr1.append((seller, invoice_id, date, value, 18.0, 0.0, tax, tax,
+                          hsn if rng.random() > 0.01 else "9999"))
+        if roll < 0.05 or roll >= 0.10:
+            gstr2b.append((seller, f"Vendor {seller[-8:]}", invoice_id, date, value, 0.0, tax, tax, "Y", recipient))
+        if rng.random() < 0.5:
+            einv.append((invoice_id, uuid.UUID(int=rng.getrandbits(128)).hex, f"{PERIOD}-28", "ACT"))
+
+    ingester.ensure_schema()
+    layouts = {
+        "GSTR-1": (gstr1, ingester._write_gstr1_batch),
+        "GSTR-2B": (gstr2b, ingester._write_gstr2b_batch),
+    }
+    with write_session(ingester.driver) as session:
+        for return_type, (rows, writer) in layouts.items():
+            fields = LEDGER_FIELDS[return_type]
+            for start in range(0, len(rows), batch_size):
+                session.execute_write(writer, batch=_columns(rows[start:start + batch_size], fields), period=PERIOD)
+        for start in range(0, len(einv), batch_size):
+            session.execute_write(ingester._write_einvoice_batch,
+                                  batch=_columns(einv[start:start + batch_size], EINVOICE_FIELDS))
+    ingester.run_matching(PERIOD)
+
+    # Small samples reused as parameters: existing ids, plus fresh rows for the write queries
+    sample = rng.sample([row[1] for row in gstr1], min(100, len(gstr1)))
+    fresh = invoices + 1
+    return {
+        "vendors": vendors,
+        "invoices": invoices,
+        "sample_invoice_ids": sample,
+        "sample_batches": {
+            "GSTR-1": _columns([(gstins[1], f"INV-{fresh + k:07d}", f"{PERIOD}-15", 1000.0, 18.0, 0.0, 90.0, 90.0, "7208")
+                                for k in range(100)], LEDGER_FIELDS["GSTR-1"]),
+            "GSTR-2B": _columns([(gstins[1], "Vendor", f"INV-{fresh + k:07d}", f"{PERIOD}-15", 1000.0, 0.0, 90.0, 90.0,
+                                  "Y", recipient) for k in range(100)], LEDGER_FIELDS["GSTR-2B"]),
+            "e-Invoice": _columns([(i, f"irn-{i}", f"{PERIOD}-28", "ACT") for i in sample], EINVOICE_FIELDS),
+        },
+    }
+
+
+def reset_database(driver):
+    with write_session(driver) as session:
+        while session.run("MATCH (n) WITH n LIMIT 10000 DETACH DELETE n RETURN count(*) AS n").single()["n"]:
+            pass
+
+
+def node_count(driver):
+    with read_session(driver) as session:
+        return session.run("MATCH (n) RETURN count(n) AS n").single()["n"]
+
+
+# ============================================================
+# Profiling
+# ============================================================
+def _operator(plan):
+    return plan.get("operatorType", "?").split("@")[0]
+
+
+def flatten_plan(plan, depth=0):
+    """Profile tree -> [{operator, details, db_hits, rows, time_ns, depth}] in pre-order"""
+    args = plan.get("args", {})
+    operators = [{
+        "operator": _operator(plan),
+        "details": args.get("Details", ""),
+        "db_hits": plan.get("dbHits", args.get("DbHits", 0)),
+        "rows": plan.get("rows", args.get("Rows", 0)),
+        "time_ns": plan.get("time", args.get("Time", 0)),
+        "depth": depth,
+    }]
+    for child in plan.get("children", []):
+        operators.extend(flatten_plan(child, depth + 1))
+    return operators
+
+
+def profile_query(driver, cypher, params, is_write):
+    with (write_session if is_write else read_session)(driver) as session:
+        tx = session.begin_transaction()
+        try:
+            result = tx.run("PROFILE " + cypher, params)
+            summary = result.consume()
+        finally:
+            tx.rollback()
+    operators = flatten_plan(summary.profile or {})
+    return {
+        "db_hits": sum(op["db_hits"] for op in operators),
+        "rows": operators[0]["rows"] if operators else 0,
+        "time_ms": (summary.result_available_after or 0) + (summary.result_consumed_after or 0),
+        "operators": operators,
+    }
+
+
+def profile_all(driver, dataset, only=None):
+    report = {}
+    for name, (cypher, params, is_write) in named_queries(dataset).items():
+        if only and not any(part in name for part in only):
+            continue
+        report[name] = profile_query(driver, cypher, params, is_write)
+    return report
+
+
+def _flagged(profile):
+    counts = {}
+    for op in profile["operators"]:
+        if op["operator"] in FLAGGED_OPERATORS:
+            counts[op["operator"]] = counts.get(op["operator"], 0) + 1
+    return counts
+
+
+def diff_reports(baseline, current, tolerance=DB_HITS_TOLERANCE):
+    """[(severity, query, message)]; severity is 'regression', 'warning' or 'info'"""
+    findings = []
+    for name, profile in current.items():
+        before = baseline.get(name)
+        if before is None:
+            findings.append(("info", name, "not in baseline"))
+            for operator, count in _flagged(profile).items():
+                findings.append(("warning", name, f"uses {operator} ({count}x)"))
+            continue
+        old, new = _flagged(before), _flagged(profile)
+        for operator, count in new.items():
+            if count > old.get(operator, 0):
+                details = [op["details"] for op in profile["operators"] if op["operator"] == operator]
+                findings.append(("regression", name, f"new {operator} ({old.get(operator, 0)} → {count}): "
+                                                     f"{'; '.join(d for d in details if d)}"))
+        if before["db_hits"] and profile["db_hits"] > before["db_hits"] * (1 + tolerance):
+            findings.append(("regression", name, f"db hits {before['db_hits']:,} → {profile['db_hits']:,}"))
+        elif profile["db_hits"] < before["db_hits"] * (1 - tolerance):
+            findings.append(("info", name, f"db hits improved {before['db_hits']:,} → {profile['db_hits']:,}"))
+    for name in baseline:
+        if name not in current:
+            findings.append(("info", name, "missing from this run"))
+    return findings
+
+
+def print_report(report):
+    print(f"{'query':<36} {'db hits':>12} {'rows':>8} {'ms':>8}  plan")
+    for name, profile in report.items():
+        plan = " ← ".join(dict.fromkeys(op["operator"] for op in profile["operators"]))
+        print(f"{name:<36} {profile['db_hits']:>12,} {profile['rows']:>8,} {profile['time_ms']:>8}  {plan}")
+
+
+# ============================================================
+# Throwaway Neo4j (docker)
+# ============================================================
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_neo4j(image="neo4j:5", password="profile-password", timeout=120):
+    """Start a disposable Neo4j container; returns (container_id, uri, user, password)"""
+    port = _free_port()
+    container = subprocess.run(
+        ["docker", "run", "-d", "--rm", "-p", f"127.0.0.1:{port}:7687",
+         "-e", f"NEO4J_AUTH=neo4j/{password}", image],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    uri = f"bolt://127.0.0.1:{port}"
+    driver = get_driver(uri, "neo4j", password)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            driver.verify_connectivity()
+            break
+        except Exception:
+            if time.monotonic() > deadline:
+                stop_neo4j(container)
+                raise TimeoutError(f"Neo4j container {container[:12]} not ready after {timeout}s")
+            time.sleep(1)
+    return container, uri, "neo4j", password
+
+
+def stop_neo4j(container):
+    subprocess.run(["docker", "stop", container], capture_output=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="PROFILE the backend's Cypher against a generated dataset")
+    parser.add_argument("--uri", help="Neo4j URI (default: $NEO4J_URI)")
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--start-neo4j", action="store_true", help="Run against a throwaway docker container")
+    parser.add_argument("--image", default="neo4j:5")
+    parser.add_argument("--reset", action="store_true", help="Delete everything in the target database first")
+    parser.add_argument("--vendors", type=int, default=500)
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--only", nargs="+", help="Profile only queries whose name contains one of these")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--out", help="Also write this run's full report here")
+    args = parser.parse_args()
+
+    container = None
+    uri, user, password = args.uri, args.user, args.password
+    if args.start_neo4j:
+        container, uri, user, password = start_neo4j(args.image)
+        print(f"✅ Started Neo4j container {container[:12]} at {uri}")
+    try:
+        ingester = GSTIngester(uri, user, password)
+        if args.reset:
+            reset_database(ingester.driver)
+        elif node_count(ingester.driver):
+            sys.exit("❌ Target database is not empty; pass --reset to wipe it or use --start-neo4j")
+
+        start = time.perf_counter()
+        dataset = generate_dataset(ingester, args.vendors, args.invoices)
+        print(f"✅ Generated {args.vendors} vendors / {args.invoices} invoices in {time.perf_counter() - start:.1f}s")
+
+        report = profile_all(ingester.driver, dataset, args.only)
+        print_report(report)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+
+        if args.update_baseline:
+            baseline = {}
+            if args.only and os.path.exists(args.baseline):
+                with open(args.baseline) as f:
+                    baseline = json.load(f)
+            baseline.update(report)
+            with open(args.baseline, "w") as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+            print(f"✅ Baseline written to {args.baseline}")
+        elif os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                findings = diff_reports(json.load(f), report)
+            for severity, name, message in findings:
+                mark = {"regression": "❌", "warning": "⚠️ ", "info": "  "}[severity]
+                print(f"{mark} {name}: {message}")
+            if any(severity == "regression" for severity, _, _ in findings):
+                sys.exit(1)
+            print("✅ No plan regressions against baseline")
+        else:
+            print(f"⚠️  No baseline at {args.baseline}; rerun with --update-baseline to record one")
+    finally:
+        if container:
+            stop_neo4j(container)
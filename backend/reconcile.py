@@ -4,99 +4,149 @@ Detects mismatches between GSTR-1 and GSTR-2B using Neo4j graph traversal.
 Classifies mismatches by type and severity.
 """
 
-from neo4j import GraphDatabase
+from fuzzy_match import propose_matches
+from graph_db import get_driver, read_session
+
+
+# Named so profile_queries.py can PROFILE exactly what the engine runs.
+# Every mismatch row carries the invoice's amount, tax and vendor so consumers
+# (sync.py, the archive) never depend on which rule flagged it.
+MISSING_IN_GSTR1_QUERY = """
+    MATCH (p:Invoice)-[:REPORTED_IN]->(g2:GSTR {type:'GSTR-2B', period:$period})
+    MATCH (v:Vendor)-[:ISSUED_INVOICE]->(p)
+    WHERE NOT EXISTS {
+        MATCH (p)-[:REPORTED_IN]->(:GSTR {type:'GSTR-1', period:$period})
+    }
+    RETURN p.id AS invoice_id, 
+           p.taxable_amount AS amount,
+           p.cgst + p.sgst + p.igst AS tax,
+           v.name AS vendor_name,
+           v.gstin AS vendor_gstin,
+           'Missing in GSTR-1' AS issue_type
+    ORDER BY tax DESC
+"""
+
+TAX_MISMATCH_QUERY = """
+    MATCH (i:Invoice)-[:REPORTED_IN]->(g1:GSTR {type:'GSTR-1', period:$period})
+    MATCH (i)-[:REPORTED_IN]->(g2:GSTR {type:'GSTR-2B', period:$period})
+    MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i)
+    WHERE i.cgst_gstr1 <> i.cgst OR i.sgst_gstr1 <> i.sgst
+    RETURN i.id AS invoice_id,
+           abs(i.cgst - i.cgst_gstr1) + abs(i.sgst - i.sgst_gstr1) AS tax_difference,
+           i.taxable_amount AS amount,
+           coalesce(i.cgst, 0) + coalesce(i.sgst, 0) + coalesce(i.igst, 0) AS tax,
+           v.name AS vendor_name,
+           v.gstin AS vendor_gstin,
+           'Tax Amount Mismatch' AS issue_type
+    ORDER BY tax_difference DESC
+"""
+
+HSN_MISMATCH_QUERY = """
+    MATCH (i:Invoice)-[:REPORTED_IN]->(g1:GSTR {type:'GSTR-1', period:$period})
+    MATCH (i)-[:REPORTED_IN]->(g2:GSTR {type:'GSTR-2B', period:$period})
+    WHERE i.hsn_gstr1 <> i.hsn
+    OPTIONAL MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i)
+    RETURN i.id AS invoice_id, i.hsn AS hsn_2b, i.hsn_gstr1 AS hsn_1,
+           i.taxable_amount AS amount,
+           coalesce(i.cgst, 0) + coalesce(i.sgst, 0) + coalesce(i.igst, 0) AS tax,
+           v.name AS vendor_name,
+           v.gstin AS vendor_gstin,
+           'HSN Mismatch' AS issue_type
+"""
+
+MISSING_EWAY_BILL_QUERY = """
+    MATCH (i:Invoice)-[:REPORTED_IN]->(g:GSTR {period:$period})
+    WHERE i.taxable_amount > 50000
+    AND NOT EXISTS { MATCH (i)-[:COVERS_SHIPMENT]->(:EWayBill) }
+    OPTIONAL MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i)
+    RETURN i.id AS invoice_id, i.taxable_amount AS amount,
+           coalesce(i.cgst, 0) + coalesce(i.sgst, 0) + coalesce(i.igst, 0) AS tax,
+           v.name AS vendor_name,
+           v.gstin AS vendor_gstin,
+           'E-Way Bill Missing' AS issue_type
+"""
+
+ONE_SIDED_INVOICES_QUERY = """
+    MATCH (i:Invoice)-[:REPORTED_IN]->(:GSTR {type:$filed, period:$period})
+    WHERE NOT EXISTS {
+        MATCH (i)-[:REPORTED_IN]->(:GSTR {type:$missing, period:$period})
+    }
+    MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i)
+    RETURN i.id AS invoice_id,
+           v.gstin AS gstin,
+           i.taxable_amount AS amount,
+           i.date AS date
+"""
 
 
 class ReconciliationEngine:
     """Graph-traversal reconciliation engine for GST filings"""
     
-    def __init__(self, uri="bolt://localhost:7687", user="neo4j", password="password"):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    def __init__(self, uri=None, user=None, password=None):
+        self.driver = get_driver(uri, user, password)
     
     def close(self):
-        self.driver.close()
+        """The driver is shared process-wide (graph_db.close_all() runs at exit)"""
+        self.driver = None
     
     def find_missing_invoices(self, period):
         """
         Find invoices in GSTR-2B that are NOT in vendor's GSTR-1.
         This multi-hop traversal: GSTR-2B → Invoice → MATCHES → GSTR-1
         """
-        with self.driver.session() as session:
+        with read_session(self.driver) as session:
             result = session.execute_read(self._query_missing, period=period)
             return result
     
     @staticmethod
     def _query_missing(tx, period):
-        query = """
-        MATCH (p:Invoice)-[:REPORTED_IN]->(g2:GSTR {type:'GSTR-2B', period:$period})
-        MATCH (v:Vendor)-[:ISSUED_INVOICE]->(p)
-        WHERE NOT EXISTS {
-            MATCH (p)-[:REPORTED_IN]->(:GSTR {type:'GSTR-1', period:$period})
-        }
-        RETURN p.id AS invoice_id, 
-               p.taxable_amount AS amount,
-               p.cgst + p.sgst + p.igst AS tax,
-               v.name AS vendor_name,
-               v.gstin AS vendor_gstin,
-               'Missing in GSTR-1' AS issue_type
-        ORDER BY tax DESC
-        """
-        return [dict(row) for row in tx.run(query, period=period)]
+        return [dict(row) for row in tx.run(MISSING_IN_GSTR1_QUERY, period=period)]
     
     def find_tax_mismatches(self, period):
         """
         Find invoices where tax amounts differ between GSTR-1 and GSTR-2B.
         """
-        with self.driver.session() as session:
+        with read_session(self.driver) as session:
             result = session.execute_read(self._query_tax_diff, period=period)
             return result
     
     @staticmethod
     def _query_tax_diff(tx, period):
-        query = """
-        MATCH (i:Invoice)-[:REPORTED_IN]->(g1:GSTR {type:'GSTR-1', period:$period})
-        MATCH (i)-[:REPORTED_IN]->(g2:GSTR {type:'GSTR-2B', period:$period})
-        MATCH (v:Vendor)-[:ISSUED_INVOICE]->(i)
-        WHERE i.cgst_gstr1 <> i.cgst OR i.sgst_gstr1 <> i.sgst
-        RETURN i.id AS invoice_id,
-               abs(i.cgst - i.cgst_gstr1) + abs(i.sgst - i.sgst_gstr1) AS tax_difference,
-               v.name AS vendor_name,
-               'Tax Amount Mismatch' AS issue_type
-        ORDER BY tax_difference DESC
-        """
-        return [dict(row) for row in tx.run(query, period=period)]
+        return [dict(row) for row in tx.run(TAX_MISMATCH_QUERY, period=period)]
     
     def find_hsn_mismatches(self, period):
         """Find invoices where HSN code differs between filings"""
-        with self.driver.session() as session:
+        with read_session(self.driver) as session:
             return session.execute_read(self._query_hsn_diff, period=period)
     
     @staticmethod
     def _query_hsn_diff(tx, period):
-        query = """
-        MATCH (i:Invoice)-[:REPORTED_IN]->(g1:GSTR {type:'GSTR-1', period:$period})
-        MATCH (i)-[:REPORTED_IN]->(g2:GSTR {type:'GSTR-2B', period:$period})
-        WHERE i.hsn_gstr1 <> i.hsn
-        RETURN i.id AS invoice_id, i.hsn AS hsn_2b, i.hsn_gstr1 AS hsn_1,
-               'HSN Mismatch' AS issue_type
-        """
-        return [dict(row) for row in tx.run(query, period=period)]
+        return [dict(row) for row in tx.run(HSN_MISMATCH_QUERY, period=period)]
     
     def find_missing_ewaybills(self, period):
         """Find invoices above threshold with no e-Way Bill"""
-        with self.driver.session() as session:
+        with read_session(self.driver) as session:
             return session.execute_read(self._query_missing_ewb, period=period)
     
     @staticmethod
     def _query_missing_ewb(tx, period):
-        query = """
-        MATCH (i:Invoice)-[:REPORTED_IN]->(g:GSTR {period:$period})
-        WHERE i.taxable_amount > 50000
-        AND NOT EXISTS { MATCH (i)-[:COVERS_SHIPMENT]->(:EWayBill) }
-        RETURN i.id AS invoice_id, i.taxable_amount AS amount,
-               'E-Way Bill Missing' AS issue_type
+        return [dict(row) for row in tx.run(MISSING_EWAY_BILL_QUERY, period=period)]
+    
+    def find_near_miss_matches(self, period, **tolerances):
+        """
+        Propose GSTR-2B-only ↔ GSTR-1-only pairs whose invoice numbers differ only in
+        formatting (prefix, padding, separators, FY suffix) within amount/date tolerance.
         """
-        return [dict(row) for row in tx.run(query, period=period)]
+        with read_session(self.driver) as session:
+            only_2b = session.execute_read(self._query_one_sided, period=period,
+                                           filed='GSTR-2B', missing='GSTR-1')
+            only_1 = session.execute_read(self._query_one_sided, period=period,
+                                          filed='GSTR-1', missing='GSTR-2B')
+        return propose_matches(only_2b, only_1, **tolerances)
+    
+    @staticmethod
+    def _query_one_sided(tx, period, filed, missing):
+        return [dict(row) for row in tx.run(ONE_SIDED_INVOICES_QUERY, period=period, filed=filed, missing=missing)]
     
     def classify_mismatch(self, invoice, vendor_history):
         """Rule-based risk classification with financial weighting"""
@@ -117,10 +167,17 @@ class ReconciliationEngine:
         hsn_diff = self.find_hsn_mismatches(period)
         ewb_missing = self.find_missing_ewaybills(period)
         
+        # Flag "missing" invoices that are probably a formatting near-miss of a GSTR-1 entry
+        near_misses = self.find_near_miss_matches(period)
+        suggested = {m['gstr2b_invoice_id']: m for m in near_misses}
+        for m in missing:
+            if m['invoice_id'] in suggested:
+                m['suggested_match'] = suggested[m['invoice_id']]['gstr1_invoice_id']
+        
         all_mismatches = missing + tax_diff + hsn_diff + ewb_missing
         
         # Sort by financial impact
-        all_mismatches.sort(key=lambda x: x.get('tax', x.get('amount', 0)), reverse=True)
+        all_mismatches.sort(key=lambda x: x.get('tax') or 0, reverse=True)
         
         return {
             "period": period,
@@ -131,6 +188,7 @@ class ReconciliationEngine:
                 "hsn_mismatch": len(hsn_diff),
                 "eway_bill_missing": len(ewb_missing),
             },
+            "near_miss_candidates": near_misses,
             "mismatches": all_mismatches
         }
 
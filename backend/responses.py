@@ -0,0 +1,112 @@
+"""
+Fast JSON Responses
+orjson encoding (ObjectId / datetime handled natively, no per-document dict
+rewriting), negotiated br/gzip compression above a size threshold, and strong
+ETags so an unchanged list costs the client a 304 instead of the full payload.
+
+brotli is optional: without it only gzip is offered.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESS_MIN_BYTES = 1024
+_CACHE_SIZE = 64
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content):
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _accepted(accept_encoding):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding):
+    accepted = _accepted(accept_encoding)
+    wildcard = accepted.get("*", 0)
+    offers = (["br"] if brotli else []) + ["gzip"]
+    best = max(offers, key=lambda c: accepted.get(c, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+# Compressed bodies of recently served payloads, keyed by ETag: an unchanged
+# list is hashed on every request but compressed only once
+_compressed = OrderedDict()
+_compressed_lock = threading.Lock()
+
+
+def _compressed_body(etag, body, encoding):
+    with _compressed_lock:
+        cached = _compressed.get(etag)
+        if cached is not None:
+            _compressed.move_to_end(etag)
+            return cached
+    data = _compress(body, encoding)
+    with _compressed_lock:
+        _compressed[etag] = data
+        while len(_compressed) > _CACHE_SIZE:
+            _compressed.popitem(last=False)
+    return data
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def json_response(request, content, min_compress_bytes=COMPRESS_MIN_BYTES):
+    """Encode `content` and answer with 304 / compressed / plain JSON as the request allows"""
+    body = dumps(content)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding")) \
+        if len(body) >= min_compress_bytes else None
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    # Each representation gets its own strong validator
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = _compressed_body(etag, body, encoding)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -12,6 +12,27 @@ import joblib
 import json
 
 
+VENDOR_FEATURES_QUERY = """
+    MATCH (v:Vendor)
+    OPTIONAL MATCH (v)-[:ISSUED_INVOICE]->(i:Invoice)
+    WHERE i.match_status <> 'Matched'
+    WITH v, count(i) AS mismatch_count, 
+         coalesce(sum(i.cgst + i.sgst + i.igst), 0) AS total_tax_at_risk
+    OPTIONAL MATCH (v)-[:ISSUED_INVOICE]->(all_inv:Invoice)
+    WITH v, mismatch_count, total_tax_at_risk, count(all_inv) AS tx_volume
+    RETURN v.gstin AS gstin,
+           v.name AS name,
+           mismatch_count,
+           total_tax_at_risk,
+           coalesce(v.filing_delay_days, 0) AS filing_delay_days,
+           coalesce(v.pagerank, 0.5) AS graph_centrality,
+           tx_volume AS transaction_volume,
+           coalesce(v.community_id, 0) AS community_cluster,
+           coalesce(v.einvoice_rate, 0.9) AS einvoice_compliance_rate,
+           coalesce(v.state_risk, 0.5) AS state_risk_factor
+"""
+
+
 class VendorRiskModel:
     """ML model for predicting vendor compliance risk"""
     
@@ -29,29 +50,11 @@ class VendorRiskModel:
             'state_risk_factor'
         ]
     
-    def extract_features_from_graph(self, driver, vendor_list=None):
+    def extract_features_from_graph(self, driver=None, vendor_list=None):
         """Extract ML features from Neo4j Knowledge Graph using GDS"""
-        with driver.session() as session:
-            query = """
-            MATCH (v:Vendor)
-            OPTIONAL MATCH (v)-[:ISSUED_INVOICE]->(i:Invoice)
-            WHERE i.match_status <> 'Matched'
-            WITH v, count(i) AS mismatch_count, 
-                 coalesce(sum(i.cgst + i.sgst + i.igst), 0) AS total_tax_at_risk
-            OPTIONAL MATCH (v)-[:ISSUED_INVOICE]->(all_inv:Invoice)
-            WITH v, mismatch_count, total_tax_at_risk, count(all_inv) AS tx_volume
-            RETURN v.gstin AS gstin,
-                   v.name AS name,
-                   mismatch_count,
-                   total_tax_at_risk,
-                   coalesce(v.filing_delay_days, 0) AS filing_delay_days,
-                   coalesce(v.pagerank, 0.5) AS graph_centrality,
-                   tx_volume AS transaction_volume,
-                   coalesce(v.community_id, 0) AS community_cluster,
-                   coalesce(v.einvoice_rate, 0.9) AS einvoice_compliance_rate,
-                   coalesce(v.state_risk, 0.5) AS state_risk_factor
-            """
-            result = session.run(query)
+        from graph_db import read_session
+        with read_session(driver) as session:
+            result = session.run(VENDOR_FEATURES_QUERY)
             return pd.DataFrame([dict(r) for r in result])
     
     def generate_synthetic_training_data(self, n_samples=500):
@@ -0,0 +1,136 @@
+"""
+ITC Rollups
+Keeps (period, vendorId, matchStatus) -> invoice count and sum of totalTax in the
+`itc_rollups` collection so trend charts never have to scan `invoices`.
+
+Maintained incrementally with $inc on every invoice write / status change, and
+rebuildable from scratch with a single aggregation pipeline.
+
+When a closed period is archived and its invoices are pruned, its rows move to
+`itc_rollups_archived`: trend charts keep the period, and a rebuild (which only
+sees live invoices) cannot drop it.
+"""
+
+from pymongo import UpdateOne
+
+
+ROLLUPS = "itc_rollups"
+ARCHIVED_ROLLUPS = "itc_rollups_archived"
+GROUP_FIELDS = {"period": "$period", "vendor": "$vendorId", "status": "$matchStatus"}
+
+
+def ensure_indexes(db):
+    for name in (ROLLUPS, ARCHIVED_ROLLUPS):
+        db[name].create_index([("period", 1), ("vendorId", 1), ("matchStatus", 1)])
+
+
+def _key(period, vendor_id, match_status):
+    return {"period": period, "vendorId": vendor_id, "matchStatus": match_status}
+
+
+def increment_ops(deltas):
+    """UpdateOne upserts for {(period, vendorId, matchStatus): (count, tax)} deltas"""
+    return [
+        UpdateOne(
+            {"_id": _key(*key)},
+            {"$inc": {"count": count, "totalTax": tax}, "$set": _key(*key)},
+            upsert=True,
+        )
+        for key, (count, tax) in deltas.items()
+        if count or tax
+    ]
+
+
+def apply_deltas(db, deltas):
+    ops = increment_ops(deltas)
+    if ops:
+        db[ROLLUPS].bulk_write(ops, ordered=False)
+
+
+def record_invoices(db, invoices):
+    """Add newly inserted invoice documents to the rollups (one bulk write for any number)"""
+    deltas = {}
+    for inv in invoices:
+        key = (inv.get("period"), inv.get("vendorId"), inv.get("matchStatus"))
+        count, tax = deltas.get(key, (0, 0))
+        deltas[key] = (count + 1, tax + (inv.get("totalTax") or 0))
+    apply_deltas(db, deltas)
+
+
+def record_status_changes(db, changes):
+    """Move invoices between statuses: changes = [(period, vendorId, old_status, new_status, totalTax)]"""
+    deltas = {}
+    for period, vendor_id, old, new, tax in changes:
+        tax = tax or 0
+        if old is not None:
+            count, total = deltas.get((period, vendor_id, old), (0, 0))
+            deltas[(period, vendor_id, old)] = (count - 1, total - tax)
+        count, total = deltas.get((period, vendor_id, new), (0, 0))
+        deltas[(period, vendor_id, new)] = (count + 1, total + tax)
+    apply_deltas(db, deltas)
+
+
+def archive_period(db, period):
+    """
+    Move a period's rows out of the live rollups once its invoices are pruned from
+    `invoices`; returns the rows moved. Safe to repeat: with nothing left to move, the
+    archived rows are kept as they are.
+    """
+    rows = list(db[ROLLUPS].find({"period": period}))
+    if rows:
+        db[ARCHIVED_ROLLUPS].delete_many({"period": period})
+        db[ARCHIVED_ROLLUPS].insert_many(rows)
+        db[ROLLUPS].delete_many({"period": period})
+    return len(rows)
+
+
+def rebuild(db):
+    """Recompute every live rollup row from `invoices` in one pipeline ($out keeps the indexes)"""
+    db["invoices"].aggregate([
+        {"$group": {
+            # Missing fields group as null, the same key the incremental path writes for them
+            "_id": {field: {"$ifNull": [f"${field}", None]} for field in ("period", "vendorId", "matchStatus")},
+            "count": {"$sum": 1},
+            "totalTax": {"$sum": "$totalTax"},
+        }},
+        {"$set": {"period": "$_id.period", "vendorId": "$_id.vendorId", "matchStatus": "$_id.matchStatus"}},
+        {"$out": ROLLUPS},
+    ])
+    return db[ROLLUPS].estimated_document_count()
+
+
+def query(db, period_from=None, period_to=None, vendor_id=None, match_status=None, group_by=("period",)):
+    """Range query over the live and archived rollups, re-grouped by any of period / vendor / status"""
+    match = {}
+    if period_from or period_to:
+        match["period"] = {}
+        if period_from:
+            match["period"]["$gte"] = period_from
+        if period_to:
+            match["period"]["$lte"] = period_to
+    if vendor_id:
+        match["vendorId"] = vendor_id
+    if match_status:
+        match["matchStatus"] = match_status
+
+    unknown = [g for g in group_by if g not in GROUP_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown groupBy field(s): {', '.join(unknown)}")
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {g: GROUP_FIELDS[g] for g in group_by},
+            "count": {"$sum": "$count"},
+            "totalTax": {"$sum": "$totalTax"},
+        }},
+    ]
+    totals = {}
+    for name in (ROLLUPS, ARCHIVED_ROLLUPS):
+        for row in db[name].aggregate(pipeline):
+            key = tuple(row["_id"].get(g) for g in group_by)
+            count, tax = totals.get(key, (0, 0))
+            totals[key] = (count + row["count"], tax + row["totalTax"])
+    # Sorted like $sort would: null (missing field) first, then by value
+    return [{**dict(zip(group_by, key)), "count": count, "totalTax": tax}
+            for key, (count, tax) in sorted(totals.items(), key=lambda item: [(v is not None, v) for v in item[0]])
+            if count > 0]
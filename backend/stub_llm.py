@@ -0,0 +1,108 @@
+"""
+Stub LLM Server
+A local OpenAI-compatible /v1/chat/completions endpoint for exercising
+explain_batch.py end to end without an API key. Answers are deterministic; latency
+and rate-limit / server errors can be injected to test concurrency and retries.
+
+Usage:
+    python stub_llm.py --port 8009 --latency 0.2 --error-rate 0.1
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    server_version = "StubLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        stats = self.server.stats
+        with self.server.lock:
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            time.sleep(self.server.latency)
+            with self.server.lock:
+                roll = self.server.rng.random()
+                if roll < self.server.error_rate:
+                    stats["errors"] += 1
+            if roll < self.server.error_rate / 2:
+                return self._send(429, {"error": {"message": "rate limited"}}, {"Retry-After": self.server.retry_after})
+            if roll < self.server.error_rate:
+                return self._send(503, {"error": {"message": "overloaded"}})
+
+            prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+            invoice = re.search(r"invoice (\S+) flagged", prompt)
+            text = (f"Invoice {invoice.group(1) if invoice else 'N/A'} is flagged based on the graph evidence "
+                    f"provided ({len(prompt)} characters of context). Reconcile GSTR-1 and GSTR-2B before "
+                    f"claiming ITC under Section 16(2)(aa) CGST Act.")
+            prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(text) // 4 + 1
+            self._send(200, {
+                "id": f"stub-{stats['requests']}",
+                "object": "chat.completion",
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+        finally:
+            with self.server.lock:
+                stats["in_flight"] -= 1
+
+
+def serve(host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, seed=0, retry_after="0.05"):
+    """
+    Start the stub in a daemon thread; returns the server (base URL: server.base_url).
+    `retry_after` is the Retry-After header sent with 429s (seconds or an HTTP-date).
+    """
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8009)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 429/503 responses")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.error_rate)
+    print(f"✅ Stub LLM listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
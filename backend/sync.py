@@ -0,0 +1,187 @@
+"""
+Reconciliation → MongoDB Sync
+Applies ReconciliationEngine.full_reconciliation() output to the Mongo `invoices`
+collection served by the API. Writes are idempotent bulk upserts stamped with a
+per-period version; only documents whose status actually changed are touched.
+
+Usage:
+    python sync.py --period 2025-07
+"""
+
+import os
+from datetime import datetime
+
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+
+import rollups
+import vendor_stats
+
+
+# When one invoice has several issues, the dashboard shows the most severe one
+ISSUE_PRIORITY = {
+    "Missing in GSTR-1": 0,
+    "Tax Amount Mismatch": 1,
+    "HSN Mismatch": 2,
+    "E-Way Bill Missing": 3,
+}
+
+
+def risk_level_for(match_status, total_tax):
+    """Same rule add_invoice uses, so synced and hand-entered invoices read alike"""
+    if match_status == "Matched":
+        return "Low"
+    return "High" if (total_tax or 0) > 50000 else "Medium"
+
+
+class ReconciliationSync:
+    """Pushes graph reconciliation results into the API's MongoDB collections"""
+
+    def __init__(self, db, score=None, classify=None):
+        self.db = db
+        # predict_risk / classify_risk, to rescore vendors whose aggregates moved enough
+        self.score, self.classify = score, classify
+        self.invoices = db["invoices"]
+        self.vendors = db["vendors"]
+        self.versions = db["recon_versions"]
+        self.invoices.create_index("id")
+        self.invoices.create_index("period")
+
+    def _desired_statuses(self, result):
+        desired = {}
+        for mismatch in result["mismatches"]:
+            issue = mismatch["issue_type"]
+            current = desired.get(mismatch["invoice_id"])
+            if current is None or ISSUE_PRIORITY.get(issue, 99) < ISSUE_PRIORITY.get(current[0], 99):
+                desired[mismatch["invoice_id"]] = (issue, mismatch)
+        return desired
+
+    def diff(self, result):
+        """Return [(invoice_id, new_status, mismatch_or_None, existing_doc_or_None)] for changed invoices"""
+        period = result["period"]
+        desired = self._desired_statuses(result)
+        existing = {
+            doc["id"]: doc for doc in self.invoices.find(
+                {"period": period},
+                {"_id": 0, "id": 1, "vendorId": 1, "matchStatus": 1, "totalTax": 1, "reconSource": 1},
+            )
+        }
+
+        changes = []
+        for invoice_id, (issue, mismatch) in desired.items():
+            doc = existing.get(invoice_id)
+            if doc is None or doc.get("matchStatus") != issue:
+                changes.append((invoice_id, issue, mismatch, doc))
+
+        # Invoices a previous sync flagged that the graph no longer reports are now clean
+        for invoice_id, doc in existing.items():
+            if invoice_id in desired or doc.get("reconSource") != "graph":
+                continue
+            if doc.get("matchStatus") != "Matched":
+                changes.append((invoice_id, "Matched", None, doc))
+        return changes
+
+    def _landed(self, period, version, changes, written):
+        """
+        {(is_new, invoice_id)} of the writes that actually landed: upserts that inserted a
+        document, and updates whose document now carries this sync's version (writes
+        rejected by the version / status guard leave it untouched)
+        """
+        landed = set()
+        if written.upserted_ids:
+            landed.update((True, d["id"]) for d in self.invoices.find(
+                {"_id": {"$in": list(written.upserted_ids.values())}}, {"_id": 0, "id": 1}))
+        updated_ids = [invoice_id for invoice_id, _, _, doc in changes if doc is not None]
+        if updated_ids:
+            landed.update((False, d["id"]) for d in self.invoices.find(
+                {"period": period, "id": {"$in": updated_ids}, "reconVersion": version}, {"_id": 0, "id": 1}))
+        return landed
+
+    def apply(self, result):
+        """Apply one full_reconciliation() result; re-applying the same result writes nothing"""
+        period = result["period"]
+        changes = self.diff(result)
+        if not changes:
+            print(f"✅ Reconciliation for {period} already in sync")
+            return {"period": period, "version": None, "changed": 0, "upserted": 0}
+
+        version = self.versions.find_one_and_update(
+            {"_id": period},
+            {"$inc": {"version": 1}, "$set": {"syncedAt": datetime.now().isoformat()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )["version"]
+
+        # Invoices new to Mongo are attached to the vendor registered under their GSTIN
+        gstins = {m.get("vendor_gstin") for _, _, m, doc in changes if doc is None and m and m.get("vendor_gstin")}
+        vendor_ids = {v["gstin"]: v["id"] for v in self.vendors.find({"gstin": {"$in": list(gstins)}},
+                                                                    {"_id": 0, "id": 1, "gstin": 1})} if gstins else {}
+
+        ops, moves = [], []
+        for invoice_id, status, mismatch, doc in changes:
+            total_tax = doc.get("totalTax") if doc else (mismatch.get("tax") or 0)
+            update = {
+                "$set": {
+                    "matchStatus": status,
+                    "riskLevel": risk_level_for(status, total_tax),
+                    "reconSource": "graph",
+                    "reconVersion": version,
+                },
+            }
+            if doc is not None:
+                # A newer sync of the same period must never be overwritten by an older one, and
+                # the write only lands if the status is still the one diffed against, so the
+                # rollup delta (old -> new) is exact for every write that lands
+                ops.append(UpdateOne({"period": period, "id": invoice_id, "matchStatus": doc.get("matchStatus"),
+                                      "reconVersion": {"$not": {"$gt": version}}}, update))
+                moves.append((False, invoice_id, (period, doc.get("vendorId"), doc.get("matchStatus"),
+                                                  status, total_tax)))
+            else:
+                taxable = mismatch.get("amount") or 0
+                vendor_id = vendor_ids.get(mismatch.get("vendor_gstin"), "")
+                update["$setOnInsert"] = {
+                    "vendorId": vendor_id,
+                    "vendorName": mismatch.get("vendor_name") or "Unknown",
+                    "gstin": mismatch.get("vendor_gstin") or "",
+                    "taxableAmount": taxable,
+                    "totalTax": total_tax,
+                    "total": taxable + total_tax,
+                }
+                # Invoice ids repeat across periods: the period is part of the key, and
+                # an upsert inserts it from the filter
+                ops.append(UpdateOne({"period": period, "id": invoice_id}, update, upsert=True))
+                moves.append((True, invoice_id, (period, vendor_id, None, status, total_tax)))
+
+        written = self.invoices.bulk_write(ops, ordered=False)
+        # Rollups move only for writes that landed, keyed by the vendorId the document has
+        landed = self._landed(period, version, changes, written)
+        landed_moves = [move for is_new, invoice_id, move in moves if (is_new, invoice_id) in landed]
+        rollups.record_status_changes(self.db, landed_moves)
+        vendor_stats.record_status_changes(self.db, landed_moves, self.score, self.classify)
+        print(f"✅ Synced {len(ops)} changed invoices for {period} (version {version})")
+        return {
+            "period": period,
+            "version": version,
+            "changed": written.modified_count + written.upserted_count,
+            "upserted": written.upserted_count,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from reconcile import ReconciliationEngine
+    from vendor_stats import classify_risk, predict_risk
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Sync graph reconciliation into MongoDB")
+    parser.add_argument("--period", required=True, help="Filing period (YYYY-MM)")
+    args = parser.parse_args()
+
+    engine = ReconciliationEngine()
+    client = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017"))
+    try:
+        result = engine.full_reconciliation(args.period)
+        ReconciliationSync(client["gst_reconcile_ai"], predict_risk, classify_risk).apply(result)
+    finally:
+        engine.close()
+        client.close()
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules (run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mongo_db():
+    """In-memory MongoDB database; tests that use it skip when mongomock is not installed"""
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()["gst_reconcile_ai"]
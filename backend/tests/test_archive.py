@@ -0,0 +1,157 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+from archive import ArchivedTable, ArchiveReader, write_table
+
+
+PERIOD = "2025-04"
+
+
+def roundtrip(tmp_path, records):
+    path = str(tmp_path / "table")
+    write_table(path, records)
+    return ArchivedTable(path)
+
+
+def test_roundtrip_preserves_values_types_and_key_order(tmp_path):
+    records = [
+        {"id": "INV-1", "amount": 100, "tax": 18.5, "paid": True, "date": date(2025, 4, 2),
+         "lines": [{"hsn": "8471", "qty": 2}], "status": "Matched"},
+        {"status": "Tax Mismatch", "id": "INV-2", "amount": 250.75, "tax": 45, "paid": False,
+         "date": date(2025, 4, 3), "lines": {"note": "credit"}},
+        {"id": "INV-3", "amount": None, "tax": None, "paid": None, "date": None, "lines": None,
+         "status": "Matched"},
+    ]
+    table = roundtrip(tmp_path, records)
+    assert table.rows == 3
+    archived = table.records()
+    assert archived == records
+    assert [list(r) for r in archived] == [list(r) for r in records]
+    # Mixed int/float columns keep each value's type
+    assert [type(v) for v in table.column("amount")] == [int, float, type(None)]
+    assert [type(v) for v in table.column("tax")] == [float, int, type(None)]
+
+
+def test_missing_keys_stay_missing(tmp_path):
+    records = [{"id": "A", "note": "x"}, {"id": "B"}, {"id": "C", "note": None}]
+    assert roundtrip(tmp_path, records).records() == records
+
+
+def test_repetitive_strings_are_dictionary_encoded(tmp_path):
+    records = [{"status": s} for s in ["Matched", "Matched", "Missing in GSTR-1", "Matched"]]
+    table = roundtrip(tmp_path, records)
+    assert table.schema["columns"]["status"]["dictionary"] == ["Matched", "Missing in GSTR-1"]
+    assert table.raw("status").tolist() == [0, 0, 1, 0]
+    assert table.code_of("status", "Missing in GSTR-1") == 1
+    assert table.code_of("status", "Tax Mismatch") == -1
+    assert table.column("status") == [r["status"] for r in records]
+
+
+def test_distinct_strings_are_stored_plain(tmp_path):
+    records = [{"id": f"INV-{i}"} for i in range(5)]
+    table = roundtrip(tmp_path, records)
+    assert "dictionary" not in table.schema["columns"]["id"]
+    assert table.column("id") == [r["id"] for r in records]
+
+
+def test_all_null_and_empty_tables(tmp_path):
+    table = roundtrip(tmp_path, [{"x": None}, {"x": None}])
+    assert table.schema["columns"]["x"]["kind"] == "null"
+    assert table.column("x") == [None, None]
+    assert roundtrip(tmp_path / "empty", []).records() == []
+
+
+def test_columns_are_memory_mapped(tmp_path):
+    table = roundtrip(tmp_path, [{"amount": v} for v in (1.5, 2.5, 3.5)])
+    assert table.raw("amount").filename is not None
+
+
+@pytest.fixture
+def archive_with(tmp_path):
+    """Write a period partition whose mongo_invoices table holds `docs`"""
+    def make(docs):
+        partition = tmp_path / f"period={PERIOD}"
+        write_table(str(partition / "mongo_invoices"), docs)
+        (partition / "_meta.json").write_text(json.dumps({"period": PERIOD}))
+        return ArchiveReader(str(tmp_path))
+    return make
+
+
+def test_stats_counts_mismatches_and_tax_at_risk(archive_with):
+    reader = archive_with([
+        {"id": "A", "matchStatus": "Matched", "totalTax": 10},
+        {"id": "B", "matchStatus": "Tax Mismatch", "totalTax": 20},
+        {"id": "C", "matchStatus": "Matched", "totalTax": 30},
+        {"id": "D", "matchStatus": "Missing in GSTR-1", "totalTax": 40.5},
+    ])
+    assert reader.has(PERIOD) and reader.periods() == [PERIOD]
+    assert reader.stats(PERIOD) == {"period": PERIOD, "totalInvoices": 4, "totalMismatches": 2,
+                                    "atRiskITC": 60.5, "matchRate": 50.0}
+
+
+def test_stats_without_status_column_counts_everything_as_unmatched(archive_with):
+    reader = archive_with([{"id": "A", "totalTax": 10}, {"id": "B", "totalTax": 5}])
+    assert reader.stats(PERIOD)["totalMismatches"] == 2
+    assert reader.stats(PERIOD)["atRiskITC"] == 15
+
+
+def test_stats_with_all_null_status(archive_with):
+    reader = archive_with([{"id": "A", "matchStatus": None, "totalTax": 10},
+                           {"id": "B", "matchStatus": None, "totalTax": 5}])
+    assert reader.stats(PERIOD) == {"period": PERIOD, "totalInvoices": 2, "totalMismatches": 2,
+                                    "atRiskITC": 15, "matchRate": 0.0}
+
+
+def test_stats_with_some_null_status_and_no_tax(archive_with):
+    reader = archive_with([{"id": "A", "matchStatus": "Matched"}, {"id": "B", "matchStatus": None},
+                           {"id": "C", "matchStatus": "Matched"}])
+    stats = reader.stats(PERIOD)
+    assert stats["totalMismatches"] == 1
+    assert stats["atRiskITC"] == 0
+
+
+def test_stats_of_an_empty_period(archive_with):
+    reader = archive_with([])
+    assert reader.stats(PERIOD)["totalInvoices"] == 0
+    assert os.path.isdir(os.path.join(reader.root, f"period={PERIOD}"))
+
+
+class EmptyGraphSession:
+    """Write session over a graph with nothing left to delete"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute_write(self, work, **kwargs):
+        return 0
+
+
+class EmptyGraphDriver:
+    def session(self, **kwargs):
+        return EmptyGraphSession()
+
+
+def test_prune_keeps_the_periods_rollups(mongo_db, tmp_path):
+    import rollups
+    from archive import PeriodArchiver
+    from ledger import IngestionLedger
+
+    docs = [{"id": "A", "period": PERIOD, "vendorId": "V1", "matchStatus": "Matched", "totalTax": 10},
+            {"id": "B", "period": "2025-05", "vendorId": "V1", "matchStatus": "Matched", "totalTax": 5}]
+    mongo_db["invoices"].insert_many([dict(d) for d in docs])
+    rollups.record_invoices(mongo_db, docs)
+    ledger = IngestionLedger(str(tmp_path / "ledger.db"))
+    try:
+        removed = PeriodArchiver(mongo_db, driver=EmptyGraphDriver(), root=str(tmp_path), ledger=ledger).prune(PERIOD)
+    finally:
+        ledger.close()
+
+    assert removed["mongo_invoices"] == 1
+    assert [d["id"] for d in mongo_db["invoices"].find()] == ["B"]
+    assert [(r["period"], r["count"]) for r in rollups.query(mongo_db)] == [(PERIOD, 1), ("2025-05", 1)]
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import stub_llm
+from explain_batch import BatchExplainer, ChatClient, RateLimiter, parse_retry_after
+
+
+@pytest.fixture(params=["0.05", "Wed, 21 Oct 2015 07:28:00 GMT"], ids=["seconds", "http-date"])
+def stub(request):
+    server = stub_llm.serve(latency=0.02, error_rate=0.3, seed=7, retry_after=request.param)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_retry_after_seconds_and_http_date():
+    assert parse_retry_after("0.05") == 0.05
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    in_30s = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= parse_retry_after(in_30s) <= 30
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_batch_respects_concurrency_and_retries_through_errors(stub):
+    progress = []
+    explainer = BatchExplainer(
+        client=ChatClient(base_url=stub.base_url, api_key="test", model="stub"),
+        concurrency=4, requests_per_minute=10000, max_retries=10, backoff=0.01, max_backoff=0.05,
+        on_progress=lambda counts, result: progress.append(counts),
+    )
+    invoice_ids = [f"INV-{i:03}" for i in range(40)]
+    results = asyncio.run(explainer.explain_many(invoice_ids, contexts={}))
+
+    assert [r["invoice_id"] for r in results] == invoice_ids
+    assert all("error" not in r for r in results)
+    assert all(r["explanation"].startswith(f"Invoice {r['invoice_id']} ") for r in results)
+    stats = stub.stats
+    assert 1 < stats["max_in_flight"] <= 4
+    assert stats["errors"] > 0
+    # Every injected 429/503 cost exactly one retry, and nothing else was retried
+    assert sum(r["attempts"] - 1 for r in results) == stats["errors"]
+    assert stats["requests"] == len(invoice_ids) + stats["errors"]
+    assert progress[-1] == {"completed": 40, "failed": 0, "total": 40}
+
+
+def test_long_retry_after_is_capped_at_max_backoff():
+    # Seed 3 answers 4 of the first 10 requests with a 429 asking for an hour's wait
+    server = stub_llm.serve(error_rate=0.5, seed=3, retry_after="3600")
+    try:
+        explainer = BatchExplainer(
+            client=ChatClient(base_url=server.base_url, api_key="test", model="stub"),
+            concurrency=4, requests_per_minute=10000, max_retries=10, backoff=0.01, max_backoff=0.05,
+        )
+
+        async def timed():
+            start = asyncio.get_running_loop().time()
+            results = await explainer.explain_many([f"INV-{i:03}" for i in range(10)], contexts={})
+            return results, asyncio.get_running_loop().time() - start
+
+        results, elapsed = asyncio.run(timed())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert all("error" not in r for r in results)
+    assert server.stats["errors"] > 0
+    assert elapsed < 5
+
+
+def test_rate_limiter_caps_requests_per_window():
+    async def burst():
+        limiter = RateLimiter(requests_per_minute=3, tokens_per_minute=1000, window=0.2)
+        start = asyncio.get_running_loop().time()
+        for _ in range(6):
+            await limiter.acquire(10)
+        return asyncio.get_running_loop().time() - start
+
+    assert asyncio.run(burst()) >= 0.2
@@ -0,0 +1,143 @@
+from array import array
+
+import pytest
+
+from fraud_rings import CircularTradingDetector, FlowGraph, bounded_cycles, strongly_connected_components
+
+
+def flow_graph(edges):
+    """FlowGraph from (seller, buyer, itc) triples; amount mirrors ITC, one invoice per edge"""
+    gstins = sorted({g for s, b, _ in edges for g in (s, b)})
+    ids = {g: i for i, g in enumerate(gstins)}
+    return FlowGraph(
+        gstins,
+        array("l", [ids[s] for s, _, _ in edges]),
+        array("l", [ids[b] for _, b, _ in edges]),
+        array("d", [itc * 5 for _, _, itc in edges]),
+        array("d", [itc for _, _, itc in edges]),
+        array("l", [1] * len(edges)),
+    )
+
+
+def named(graph, nodes):
+    return [graph.gstins[n] for n in nodes]
+
+
+def canonical(cycle):
+    """Rotate a cycle to start at its smallest member, so equal rings compare equal"""
+    k = cycle.index(min(cycle))
+    return tuple(cycle[k:] + cycle[:k])
+
+
+def all_cycles(graph, **kwargs):
+    component, components = strongly_connected_components(graph)
+    return [canonical(named(graph, nodes))
+            for members in components
+            for nodes, _ in bounded_cycles(graph, component, members, **kwargs)]
+
+
+class StubDetector(CircularTradingDetector):
+    def __init__(self, graph):
+        super().__init__(driver=object())
+        self.graph = graph
+
+    def project(self, period_from, period_to):
+        return self.graph
+
+
+def test_edges_are_stored_heaviest_first():
+    graph = flow_graph([("A", "B", 1), ("A", "C", 9), ("A", "D", 5)])
+    a = graph.gstins.index("A")
+    assert [graph.itc[s] for s in graph.edges(a)] == [9, 5, 1]
+    assert [graph.gstins[graph.targets[s]] for s in graph.edges(a)] == ["C", "D", "B"]
+
+
+def test_scc_finds_only_cyclic_groups():
+    graph = flow_graph([
+        ("A", "B", 1), ("B", "C", 1), ("C", "A", 1),   # ring
+        ("C", "D", 1),                                 # D only receives
+        ("E", "F", 1), ("F", "E", 1),                  # pair
+        ("G", "H", 1),                                 # chain, no cycle
+    ])
+    component, components = strongly_connected_components(graph)
+    assert sorted(sorted(named(graph, members)) for members in components) == [["A", "B", "C"], ["E", "F"]]
+    for gstin in "DGH":
+        assert component[graph.gstins.index(gstin)] == -1
+
+
+def test_scc_on_a_long_chain_does_not_recurse():
+    n = 5000
+    edges = [(f"V{i:05}", f"V{i + 1:05}", 1) for i in range(n)] + [(f"V{n:05}", "V00000", 1)]
+    _, components = strongly_connected_components(flow_graph(edges))
+    assert len(components) == 1 and len(components[0]) == n + 1
+
+
+def test_each_cycle_is_reported_once():
+    graph = flow_graph([
+        ("A", "B", 1), ("B", "A", 1),
+        ("B", "C", 1), ("C", "A", 1),
+        ("C", "D", 1), ("D", "B", 1),
+    ])
+    cycles = all_cycles(graph)
+    assert sorted(cycles) == sorted({("A", "B"), ("A", "B", "C"), ("B", "C", "D")})
+    assert len(cycles) == len(set(cycles))
+
+
+def test_max_length_bounds_the_ring():
+    ring = [("A", "B", 1), ("B", "C", 1), ("C", "D", 1), ("D", "A", 1)]
+    assert all_cycles(flow_graph(ring), max_length=4) == [("A", "B", "C", "D")]
+    assert all_cycles(flow_graph(ring), max_length=3) == []
+
+
+def test_min_edge_itc_drops_thin_links():
+    graph = flow_graph([("A", "B", 10), ("B", "A", 10), ("B", "C", 1), ("C", "A", 10)])
+    assert all_cycles(graph, min_edge_itc=5) == [("A", "B")]
+
+
+def test_expansion_budget_limits_search_not_cycles():
+    # Complete digraph on 6 vendors: many cycles, far more paths
+    names = "ABCDEF"
+    graph = flow_graph([(s, b, 1) for s in names for b in names if s != b])
+    everything = all_cycles(graph, max_length=6)
+    limited = all_cycles(graph, max_length=6, max_expansions=10)
+    assert 0 < len(limited) < len(everything)
+    assert all_cycles(graph, max_length=6, max_expansions=0) == []
+
+
+def test_heaviest_rings_are_found_first():
+    # One component: a cheap ring among low ids, an expensive one among high ids
+    graph = flow_graph([
+        ("A", "B", 1), ("B", "A", 1), ("B", "Y", 1), ("Y", "B", 1),
+        ("Y", "Z", 100), ("Z", "Y", 100),
+    ])
+    first = all_cycles(graph, max_expansions=1)
+    assert first == [("Y", "Z")]
+
+
+def test_detect_ranks_rings_by_itc_and_prunes_below_the_top():
+    graph = flow_graph([
+        ("A", "B", 1), ("B", "A", 1),
+        ("C", "D", 50), ("D", "E", 50), ("E", "C", 50),
+        ("F", "G", 20), ("G", "F", 20),
+    ])
+    report = StubDetector(graph).detect("2025-04", "2025-09", top=2)
+    assert [canonical(r["vendors"]) for r in report["rings"]] == [("C", "D", "E"), ("F", "G")]
+    assert report["rings"][0]["itc_at_stake"] == pytest.approx(150)
+    assert report["rings"][0]["circulated_amount"] == pytest.approx(250)
+    assert [c["size"] for c in report["clusters"]] == [3, 2]
+    assert report["trading_pairs"] == 7
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pruned_top_rings_match_exhaustive_search(seed):
+    import random
+    rng = random.Random(seed)
+    names = [f"V{i}" for i in range(9)]
+    edges = {(s, b): rng.randint(1, 100) for s in names for b in names if s != b and rng.random() < 0.35}
+    graph = flow_graph([(s, b, itc) for (s, b), itc in edges.items()])
+    component, components = strongly_connected_components(graph)
+    exhaustive = sorted((sum(graph.itc[s] for s in slots)
+                         for members in components
+                         for _, slots in bounded_cycles(graph, component, members, max_length=4)), reverse=True)
+    report = StubDetector(graph).detect("2025-04", "2025-09", max_length=4, top=5)
+    assert [r["itc_at_stake"] for r in report["rings"]] == [round(x, 2) for x in exhaustive[:5]]
@@ -0,0 +1,80 @@
+import pytest
+
+from fuzzy_match import FuzzyInvoiceIndex, normalize_invoice_number, propose_matches, serial_key
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("INV-00123/24-25", "INV123"),
+    ("inv 123 / FY2425", "INV123"),
+    ("INV-123-2024-25", "INV123"),
+    ("INV/123/2024-2025", "INV123"),
+    ("INV-123-FY24-25", "INV123"),
+    ("INV-2025-10", "INV2025-10"),
+])
+def test_normalize_strips_marked_fy_suffix(raw, expected):
+    assert normalize_invoice_number(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("INV-0001", "INV1"),
+    ("INV-2425", "INV2425"),
+    ("INV-2526", "INV2526"),
+    ("INV-000001", "INV1"),
+    ("INV-000102", "INV102"),
+    ("INV/24-25", "INV24-25"),
+])
+def test_normalize_keeps_serials(raw, expected):
+    assert normalize_invoice_number(raw) == expected
+
+
+def test_serial_key_is_trailing_number():
+    assert serial_key("INV-00123/24-25") == "123"
+    assert serial_key("INV-2425") == "2425"
+    assert serial_key("INV-2025-10") == "10"
+    assert serial_key("INV-2025-0010") == "10"
+
+
+def test_number_boundaries_are_kept():
+    assert normalize_invoice_number("INV-1-23") == "INV1-23"
+    assert normalize_invoice_number("INV-12-3") == "INV12-3"
+    assert normalize_invoice_number("INV/1/23") == normalize_invoice_number("inv 1-023")
+
+
+def _inv(invoice_id, gstin="29AABCU9603R1ZM", amount=1000.0, date="2025-07-10"):
+    return {"invoice_id": invoice_id, "gstin": gstin, "amount": amount, "date": date}
+
+
+def test_propose_matches_pairs_formatting_variants():
+    proposals = propose_matches([_inv("INV-00123/24-25")], [_inv("INV123")])
+    assert [(p["gstr2b_invoice_id"], p["gstr1_invoice_id"]) for p in proposals] == [("INV-00123/24-25", "INV123")]
+    assert proposals[0]["similarity"] == 1.0
+
+
+@pytest.mark.parametrize("left, right", [
+    ("INV-0001", "INV-0102"),
+    ("INV-000001", "INV-000102"),
+    ("INV-2425", "INV-3536"),
+    ("INV-2425", "INV-2526"),
+    ("INV-1-23", "INV-12-3"),
+    ("INV-2025-10", "INV-2025-11"),
+])
+def test_propose_matches_does_not_pair_distinct_serials(left, right):
+    assert propose_matches([_inv(left)], [_inv(right)]) == []
+
+
+def test_propose_matches_respects_vendor_and_amount():
+    assert propose_matches([_inv("INV-123")], [_inv("INV123", gstin="27AABCR9718E1ZL")]) == []
+    assert propose_matches([_inv("INV-123")], [_inv("INV123", amount=5000.0)]) == []
+
+
+def test_propose_matches_is_one_to_one():
+    proposals = propose_matches([_inv("INV-123"), _inv("INV/123")], [_inv("INV123")])
+    assert len(proposals) == 1
+
+
+def test_common_serial_bucket_is_capped_like_postings():
+    index = FuzzyInvoiceIndex(max_postings=3).add_all(
+        [_inv(f"{prefix}-1") for prefix in ("AB", "CD", "EF", "GH")] + [_inv("XY-7")])
+    # Four invoices share serial "1": the bucket is over the cap and proposes nothing on its own
+    assert index.candidates(_inv("ZZ-1")) == []
+    assert [c["invoice_id"] for c in index.candidates(_inv("QQ-7"))] == ["XY-7"]
@@ -0,0 +1,105 @@
+import pytest
+
+import graph_db
+
+
+class FakeTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+        driver.open += 1
+        driver.max_open = max(driver.max_open, driver.open)
+
+    def run(self, query):
+        return self
+
+    def consume(self):
+        pass
+
+    def rollback(self):
+        self.driver.open -= 1
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def begin_transaction(self):
+        return FakeTransaction(self.driver)
+
+    def close(self):
+        self.driver.closed_sessions += 1
+
+
+class FakeDriver:
+    def __init__(self, *args, **kwargs):
+        self.open = self.max_open = 0
+        self.closed_sessions = 0
+        self.closed = False
+
+    def verify_connectivity(self):
+        pass
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+    def close(self):
+        self.closed = True
+
+
+def test_warm_holds_all_connections_at_once():
+    driver = FakeDriver()
+    graph_db.warm(driver, connections=5)
+    assert driver.max_open == 5
+    assert driver.open == 0
+
+
+def test_get_driver_keys_on_password(monkeypatch):
+    monkeypatch.setattr(graph_db.GraphDatabase, "driver", FakeDriver)
+    monkeypatch.setattr(graph_db, "_drivers", {})
+    monkeypatch.setattr(graph_db, "_stats", {})
+    first = graph_db.get_driver("bolt://test:7687", "neo4j", "one", warm_up=0)
+    assert graph_db.get_driver("bolt://test:7687", "neo4j", "one", warm_up=0) is first
+    assert graph_db.get_driver("bolt://test:7687", "neo4j", "two", warm_up=0) is not first
+    assert all("one" not in key and "two" not in key for key in graph_db._drivers)
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    monkeypatch.setattr(graph_db.GraphDatabase, "driver", FakeDriver)
+    monkeypatch.setattr(graph_db, "_drivers", {})
+    monkeypatch.setattr(graph_db, "_stats", {})
+    return graph_db.get_driver("bolt://test:7687", "neo4j", "secret", warm_up=0)
+
+
+def test_sessions_are_counted_and_timed(fake_pool):
+    with graph_db.read_session(fake_pool) as first:
+        second = graph_db.write_session(fake_pool)
+        assert graph_db.pool_stats()[0]["active_sessions"] == 2
+        second.close()
+        second.close()
+        assert first.begin_transaction().driver is fake_pool
+    stats = graph_db.pool_stats()[0]
+    assert stats["sessions"] == 2 and stats["active_sessions"] == 0 and stats["max_active_sessions"] == 2
+    assert stats["max_session_ms"] >= stats["avg_session_ms"] > 0
+    assert fake_pool.closed_sessions == 3
+
+
+def test_sessions_of_other_drivers_are_not_wrapped():
+    session = graph_db.read_session(FakeDriver())
+    assert isinstance(session, FakeSession)
+
+
+def test_shared_driver_handle_never_closes_the_pool(fake_pool):
+    handle = graph_db.SharedDriver(fake_pool)
+    with handle:
+        assert isinstance(handle.session(), FakeSession)
+    handle.close()
+    del handle
+    assert not fake_pool.closed
+    assert graph_db.get_driver("bolt://test:7687", "neo4j", "secret", warm_up=0) is fake_pool
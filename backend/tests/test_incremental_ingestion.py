@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+import ingestion
+from ingestion import GSTIngester
+from ledger import IngestionLedger
+
+
+PERIOD = "2025-07"
+HEADER = ("GSTIN of supplier,Trade/Legal name,Invoice number,Invoice Date,Taxable Value,"
+          "Integrated Tax,Central Tax,State/UT Tax\n")
+
+
+class RecordingSession:
+    """Stands in for a write session: keeps the invoice ids each batch writes or retracts"""
+
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute_write(self, work, **kwargs):
+        if "batch" in kwargs:
+            self.log["written"].extend(kwargs["batch"]["invoice_id"])
+        else:
+            self.log["retracted"].extend(kwargs["ids"])
+
+
+class RecordingDriver:
+    def __init__(self):
+        self.log = {"written": [], "retracted": []}
+
+    def session(self, **kwargs):
+        return RecordingSession(self.log)
+
+    def take(self):
+        log = {key: sorted(ids) for key, ids in self.log.items()}
+        self.log["written"].clear()
+        self.log["retracted"].clear()
+        return log
+
+
+@pytest.fixture
+def ingester(tmp_path, monkeypatch):
+    driver = RecordingDriver()
+    monkeypatch.setattr(ingestion, "get_driver", lambda *args: driver)
+    ledger = IngestionLedger(str(tmp_path / "ledger.db"))
+    yield GSTIngester(ledger=ledger), driver
+    ledger.close()
+
+
+def portal_2b_csv(tmp_path, name, invoice_ids):
+    """Portal-style GSTR-2B download: no recipient column"""
+    path = tmp_path / name
+    path.write_text(HEADER + "".join(f"27AAAAA0000A1Z5,Acme,{i},15-07-2025,100,18,0,0\n" for i in invoice_ids))
+    return str(path)
+
+
+def test_two_taxpayers_load_the_same_period_without_retracting_each_other(tmp_path, ingester):
+    ingester, driver = ingester
+    ingester.ingest_csv(portal_2b_csv(tmp_path, "t1.csv", ["INV-1", "INV-2"]), "GSTR-2B", PERIOD,
+                        recipient_gstin="29TENANT1111T1Z5")
+    assert driver.take() == {"written": ["INV-1", "INV-2"], "retracted": []}
+
+    ingester.ingest_csv(portal_2b_csv(tmp_path, "t2.csv", ["INV-2", "INV-3"]), "GSTR-2B", PERIOD,
+                        recipient_gstin="27TENANT2222T2Z5")
+    assert driver.take() == {"written": ["INV-2", "INV-3"], "retracted": []}
+
+    # Tenant 1 resends without both invoices: INV-2 is still in tenant 2's 2B, so only INV-1 goes
+    ingester.ingest_csv(portal_2b_csv(tmp_path, "t1b.csv", ["INV-9"]), "GSTR-2B", PERIOD,
+                        recipient_gstin="29TENANT1111T1Z5")
+    assert driver.take() == {"written": ["INV-9"], "retracted": ["INV-1"]}
+
+
+def test_blank_taxpayer_gstin_is_refused_before_any_write(tmp_path, ingester):
+    ingester, driver = ingester
+    with pytest.raises(ValueError, match="recipient_gstin"):
+        ingester.ingest_csv(portal_2b_csv(tmp_path, "t1.csv", ["INV-1"]), "GSTR-2B", PERIOD)
+    with pytest.raises(ValueError, match="filer_gstin"):
+        path = tmp_path / "gstr1.csv"
+        path.write_text("GSTIN/UIN of Recipient,Invoice Number,Invoice date,Taxable Value,Rate,"
+                        "Integrated Tax Amount,Central Tax Amount,State/UT Tax Amount\n"
+                        "27BBBBB0000B1Z5,INV-1,15-07-2025,100,18,18,0,0\n")
+        ingester.ingest_csv(str(path), "GSTR-1", PERIOD)
+    assert driver.take() == {"written": [], "retracted": []}
+
+
+def gstr1_json(tmp_path, name, filer, invoice_ids):
+    path = tmp_path / name
+    path.write_text(json.dumps({"gstin": filer, "b2b": [
+        {"ctin": "27BBBBB0000B1Z5", "inv": [{"inum": i, "idt": "15-07-2025", "val": 100} for i in invoice_ids]},
+    ]}))
+    return str(path)
+
+
+def test_gstr1_is_keyed_by_the_filer_not_the_counterparty(tmp_path, ingester):
+    ingester, driver = ingester
+    # Two suppliers bill the same customer (ctin) in one period
+    ingester.ingest_gstr1(gstr1_json(tmp_path, "s1.json", "29SUPPLR1111S1Z5", ["A-1"]), PERIOD)
+    ingester.ingest_gstr1(gstr1_json(tmp_path, "s2.json", "27SUPPLR2222S2Z5", ["B-1"]), PERIOD)
+    assert driver.take() == {"written": ["A-1", "B-1"], "retracted": []}
+
+    ingester.ingest_gstr1(gstr1_json(tmp_path, "s1b.json", "29SUPPLR1111S1Z5", ["A-2"]), PERIOD)
+    assert driver.take() == {"written": ["A-2"], "retracted": ["A-1"]}
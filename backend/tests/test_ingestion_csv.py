@@ -0,0 +1,66 @@
+import pytest
+
+from ingestion import normalize_amount, normalize_date, read_csv_batches
+
+
+HEADER = ("GSTIN of supplier,Trade/Legal name,Invoice number,Invoice Date,Taxable Value,"
+          "Integrated Tax,Central Tax,State/UT Tax\n")
+
+
+@pytest.fixture
+def gstr2b_csv(tmp_path):
+    path = tmp_path / "gstr2b.csv"
+    path.write_text(HEADER + "\n".join([
+        "27AAAAA0000A1Z5,Acme,INV-1,15-07-2025,\"1,000.00\",180,0,0",
+        "27AAAAA0000A1Z5,Acme,INV-2,,500,90,0,0",
+        "29BBBBB1111B1Z5,Beta,INV-3,31/02/2025,200,36,0,0",
+        "29BBBBB1111B1Z5,Beta,INV-4,2025-07-20,(300),0,27,27",
+    ]) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_normalize_date_formats():
+    assert normalize_date("15-07-2025") == "2025-07-15"
+    assert normalize_date("15-Jul-2025") == "2025-07-15"
+    with pytest.raises(ValueError):
+        normalize_date("15th July")
+
+
+def test_normalize_amount():
+    assert normalize_amount("₹1,23,456.50") == 123456.5
+    assert normalize_amount("(1,200)") == -1200
+    assert normalize_amount("") == 0.0
+
+
+def test_rows_with_bad_dates_are_skipped_and_reported(gstr2b_csv):
+    rejected = []
+    batches = list(read_csv_batches(gstr2b_csv, "GSTR-2B", batch_size=2, rejected=rejected))
+    ids = [i for batch in batches for i in batch["invoice_id"]]
+    assert ids == ["INV-1", "INV-4"]
+    assert [row[2] for row in rejected] == ["INV-2", "INV-3"]
+    dates = [d for batch in batches for d in batch["invoice_date"]]
+    assert dates == ["2025-07-15", "2025-07-20"]
+    # Columns stay aligned after dropping rows, and defaults fill absent columns
+    assert [v for batch in batches for v in batch["taxable_value"]] == [1000.0, -300.0]
+    assert [v for batch in batches for v in batch["recipient_gstin"]] == ["", ""]
+
+
+def test_missing_required_column_is_an_error(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("Invoice number,Invoice Date\nINV-1,15-07-2025\n")
+    with pytest.raises(ValueError, match="missing column"):
+        list(read_csv_batches(str(path), "GSTR-2B"))
+
+
+def test_recipient_default_fills_missing_recipient_column(gstr2b_csv):
+    batches = read_csv_batches(gstr2b_csv, "GSTR-2B", defaults={"recipient_gstin": "27TENANT0000T1Z5"})
+    assert {r for batch in batches for r in batch["recipient_gstin"]} == {"27TENANT0000T1Z5"}
+
+
+def test_recipient_default_fills_blank_cells_only(tmp_path):
+    path = tmp_path / "gstr2b.csv"
+    path.write_text(HEADER.rstrip("\n") + ",GSTIN of recipient\n"
+                    "27AAAAA0000A1Z5,Acme,INV-1,15-07-2025,100,18,0,0,29RRRRR0000R1Z5\n"
+                    "27AAAAA0000A1Z5,Acme,INV-2,15-07-2025,100,18,0,0,\n")
+    batches = read_csv_batches(str(path), "GSTR-2B", defaults={"recipient_gstin": "27TENANT0000T1Z5"})
+    assert [r for batch in batches for r in batch["recipient_gstin"]] == ["29RRRRR0000R1Z5", "27TENANT0000T1Z5"]
@@ -0,0 +1,85 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import pytest
+
+from jobs import JobRunner, validate_files
+
+
+@pytest.fixture
+def upload_dir(tmp_path):
+    (tmp_path / "gstr1.json").write_text("{}")
+    return str(tmp_path)
+
+
+def test_validate_files_resolves_inside_upload_dir(upload_dir):
+    files = validate_files([{"path": "gstr1.json", "type": "GSTR-1"}], upload_dir)
+    assert files == [{"path": f"{upload_dir}/gstr1.json", "type": "GSTR-1"}]
+
+
+@pytest.mark.parametrize("path", ["/etc/passwd", "../gstr1.json", "sub/../../gstr1.json"])
+def test_validate_files_rejects_paths_outside_upload_dir(upload_dir, path):
+    with pytest.raises(ValueError, match="outside the upload directory"):
+        validate_files([{"path": path, "type": "GSTR-1"}], upload_dir)
+
+
+def test_validate_files_rejects_missing_file(upload_dir):
+    with pytest.raises(ValueError, match="not found"):
+        validate_files([{"path": "nope.json", "type": "GSTR-1"}], upload_dir)
+
+
+@pytest.mark.parametrize("item", [{"path": "gstr1.json", "type": "GSTR-3B"}, {"path": "gstr1.json"}])
+def test_validate_files_rejects_unknown_type(upload_dir, item):
+    with pytest.raises(ValueError, match="Unknown file type"):
+        validate_files([item], upload_dir)
+
+
+def bare_runner():
+    """JobRunner without its process pool / Manager: a plain dict stands in for the shared dict"""
+    runner = JobRunner.__new__(JobRunner)
+    runner.max_workers, runner.per_tenant_limit = 1, 1
+    runner._shared = {}
+    runner._lock = threading.RLock()
+    runner._queue, runner._jobs, runner._running = deque(), {}, {}
+    return runner
+
+
+def running_job(runner, job_id="job1"):
+    runner._jobs[job_id] = {"id": job_id, "tenant": "t", "stages": ["match"], "status": "running"}
+    runner._running[job_id] = "t"
+    runner._shared[("progress", job_id)] = {"stage": None, "completed": 1, "total": 1}
+    runner._shared[("cancel", job_id)] = True
+
+
+def test_finished_job_drops_its_shared_keys_and_keeps_progress():
+    runner = bare_runner()
+    running_job(runner)
+    future = Future()
+    future.set_result({"match": {"matched": 3}})
+    runner._finished("job1", future)
+
+    assert runner._shared == {}
+    job = runner.get("job1")
+    assert job["status"] == "succeeded" and job["result"] == {"match": {"matched": 3}}
+    assert job["progress"] == {"stage": None, "completed": 1, "total": 1}
+
+
+def test_future_cancelled_at_shutdown_is_a_cancelled_job():
+    runner = bare_runner()
+    running_job(runner)
+    future = Future()
+    future.cancel()
+    runner._finished("job1", future)
+
+    assert runner.get("job1")["status"] == "cancelled"
+    assert runner._shared == {} and runner._running == {}
+
+
+def test_failed_job_records_the_error():
+    runner = bare_runner()
+    running_job(runner)
+    future = Future()
+    future.set_exception(RuntimeError("neo4j down"))
+    runner._finished("job1", future)
+    assert runner.get("job1")["error"] == "RuntimeError: neo4j down"
@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+from ledger import IngestionLedger, record_hash
+
+
+PERIOD = "2025-07"
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = IngestionLedger(str(tmp_path / "ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+def hashes(*records):
+    """{(gstin, party_gstin, invoice_id): hash} for (gstin, party, invoice, amount) tuples"""
+    return {record[:3]: record_hash(record) for record in records}
+
+
+def load(ledger, sha256, records):
+    upserts, removals = ledger.diff("GSTR-2B", PERIOD, records)
+    ledger.commit("GSTR-2B", PERIOD, sha256, records, upserts, removals)
+    return upserts, removals
+
+
+def test_first_load_upserts_everything(ledger):
+    records = hashes(("R1", "S1", "INV-1", 100), ("R1", "S1", "INV-2", 200))
+    upserts, removals = ledger.diff("GSTR-2B", PERIOD, records)
+    assert sorted(upserts) == sorted(records)
+    assert removals == []
+
+
+def test_reload_writes_only_changes(ledger):
+    load(ledger, "a", hashes(("R1", "S1", "INV-1", 100), ("R1", "S1", "INV-2", 200)))
+    upserts, removals = ledger.diff("GSTR-2B", PERIOD, hashes(
+        ("R1", "S1", "INV-1", 100), ("R1", "S1", "INV-2", 250), ("R1", "S2", "INV-3", 300)))
+    assert sorted(upserts) == [("R1", "S1", "INV-2"), ("R1", "S2", "INV-3")]
+    assert removals == []
+
+
+def test_removals_are_scoped_to_the_files_gstins(ledger):
+    load(ledger, "a", hashes(("R1", "S1", "INV-1", 100), ("R1", "S1", "INV-2", 200)))
+    load(ledger, "b", hashes(("R2", "S1", "INV-9", 900)))
+    # R1 resends without INV-2: only R1's invoice is removed, R2's is untouched
+    upserts, removals = ledger.diff("GSTR-2B", PERIOD, hashes(("R1", "S1", "INV-1", 100)))
+    assert upserts == []
+    assert removals == [("R1", "S1", "INV-2")]
+
+
+def test_shared_invoices_are_not_retracted(ledger):
+    load(ledger, "a", hashes(("R1", "S1", "INV-1", 100)))
+    load(ledger, "b", hashes(("R2", "S1", "INV-1", 100), ("R2", "S1", "INV-2", 200)))
+    _, removals = load(ledger, "c", hashes(("R2", "S1", "INV-2", 200)))
+    assert removals == [("R2", "S1", "INV-1")]
+    assert ledger.unshared("GSTR-2B", PERIOD, removals) == []
+
+
+def test_unchanged_file_is_tracked_per_gstin(ledger):
+    load(ledger, "a", hashes(("R1", "S1", "INV-1", 100)))
+    load(ledger, "b", hashes(("R2", "S1", "INV-9", 900)))
+    # Another taxpayer's file for the same period does not displace R1's hash
+    assert ledger.is_unchanged("GSTR-2B", PERIOD, "a")
+    assert ledger.is_unchanged("GSTR-2B", PERIOD, "b")
+    assert not ledger.is_unchanged("GSTR-2B", "2025-08", "a")
+    assert not ledger.is_unchanged("GSTR-1", PERIOD, "a")
+
+
+def test_file_partly_superseded_is_not_unchanged(ledger):
+    load(ledger, "ab", hashes(("R1", "S1", "INV-1", 100), ("R2", "S1", "INV-9", 900)))
+    load(ledger, "a2", hashes(("R1", "S1", "INV-1", 150)))
+    assert not ledger.is_unchanged("GSTR-2B", PERIOD, "ab")
+    assert ledger.is_unchanged("GSTR-2B", PERIOD, "a2")
+
+
+def test_old_schema_is_dropped(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE files (return_type TEXT, period TEXT, sha256 TEXT)")
+    conn.commit()
+    conn.close()
+    ledger = IngestionLedger(path)
+    try:
+        load(ledger, "a", hashes(("R1", "S1", "INV-1", 100)))
+        assert ledger.is_unchanged("GSTR-2B", PERIOD, "a")
+    finally:
+        ledger.close()
+
+
+def test_forget_period_lets_the_same_file_load_again(ledger):
+    load(ledger, "a", hashes(("R1", "S1", "INV-1", 100)))
+    upserts, removals = ledger.diff("GSTR-2B", "2025-08", hashes(("R1", "S1", "INV-5", 100)))
+    ledger.commit("GSTR-2B", "2025-08", "b", hashes(("R1", "S1", "INV-5", 100)), upserts, removals)
+
+    assert ledger.forget_period(PERIOD) == 1
+    assert not ledger.is_unchanged("GSTR-2B", PERIOD, "a")
+    upserts, _ = ledger.diff("GSTR-2B", PERIOD, hashes(("R1", "S1", "INV-1", 100)))
+    assert upserts == [("R1", "S1", "INV-1")]
+    # Other periods are untouched
+    assert ledger.is_unchanged("GSTR-2B", "2025-08", "b")
@@ -0,0 +1,87 @@
+from profile_queries import diff_reports, flatten_plan
+
+
+# Shaped like neo4j's ResultSummary.profile: the root operator first, counters at the top level
+PLAN = {
+    "operatorType": "ProduceResults@neo4j",
+    "dbHits": 0, "rows": 3, "time": 120,
+    "args": {"Details": "id"},
+    "children": [{
+        "operatorType": "Expand(All)@neo4j",
+        "dbHits": 40, "rows": 3, "time": 900,
+        "args": {"Details": "(i)-[:REPORTED_IN]->(g)"},
+        "children": [{
+            "operatorType": "NodeIndexSeek@neo4j",
+            "dbHits": 12, "rows": 10, "time": 300,
+            "args": {"Details": "RANGE INDEX i:Invoice(id)"},
+            "children": [],
+        }],
+    }],
+}
+
+# Older servers only report the counters in args
+LEGACY_PLAN = {
+    "operatorType": "NodeByLabelScan",
+    "args": {"DbHits": 501, "Rows": 500, "Details": "i:Invoice"},
+}
+
+
+def profile(*operators, db_hits=None):
+    ops = [{"operator": name, "details": details, "db_hits": hits, "rows": 1, "time_ns": 0, "depth": depth}
+           for depth, (name, details, hits) in enumerate(operators)]
+    return {"db_hits": sum(op["db_hits"] for op in ops) if db_hits is None else db_hits,
+            "rows": 1, "time_ms": 1, "operators": ops}
+
+
+SEEK = profile(("ProduceResults", "", 0), ("NodeIndexSeek", "i:Invoice(id)", 100))
+
+
+def test_flatten_plan_is_pre_order_with_depths_and_counters():
+    assert flatten_plan(PLAN) == [
+        {"operator": "ProduceResults", "details": "id", "db_hits": 0, "rows": 3, "time_ns": 120, "depth": 0},
+        {"operator": "Expand(All)", "details": "(i)-[:REPORTED_IN]->(g)", "db_hits": 40, "rows": 3,
+         "time_ns": 900, "depth": 1},
+        {"operator": "NodeIndexSeek", "details": "RANGE INDEX i:Invoice(id)", "db_hits": 12, "rows": 10,
+         "time_ns": 300, "depth": 2},
+    ]
+
+
+def test_flatten_plan_reads_counters_from_args_and_tolerates_an_empty_plan():
+    assert flatten_plan(LEGACY_PLAN) == [
+        {"operator": "NodeByLabelScan", "details": "i:Invoice", "db_hits": 501, "rows": 500, "time_ns": 0,
+         "depth": 0}]
+    assert flatten_plan({}) == [
+        {"operator": "?", "details": "", "db_hits": 0, "rows": 0, "time_ns": 0, "depth": 0}]
+
+
+def test_unchanged_plan_has_no_findings():
+    assert diff_reports({"q": SEEK}, {"q": SEEK}) == []
+
+
+def test_new_label_scan_is_a_regression_with_its_details():
+    scan = profile(("ProduceResults", "", 0), ("NodeByLabelScan", "i:Invoice", 100))
+    assert diff_reports({"q": SEEK}, {"q": scan}) == [
+        ("regression", "q", "new NodeByLabelScan (0 → 1): i:Invoice")]
+
+
+def test_flagged_operator_already_in_the_baseline_is_not_reported_again():
+    scan = profile(("CartesianProduct", "", 0), ("AllNodesScan", "n", 100))
+    assert diff_reports({"q": scan}, {"q": scan}) == []
+
+
+def test_db_hits_beyond_tolerance_regress_and_drops_are_reported():
+    assert diff_reports({"q": SEEK}, {"q": profile(("NodeIndexSeek", "", 0), db_hits=125)}) == []
+    assert diff_reports({"q": SEEK}, {"q": profile(("NodeIndexSeek", "", 0), db_hits=126)}) == [
+        ("regression", "q", "db hits 100 → 126")]
+    assert diff_reports({"q": SEEK}, {"q": profile(("NodeIndexSeek", "", 0), db_hits=50)}) == [
+        ("info", "q", "db hits improved 100 → 50")]
+    assert diff_reports({"q": SEEK}, {"q": profile(("NodeIndexSeek", "", 0), db_hits=126)}, tolerance=0.5) == []
+
+
+def test_queries_added_or_missing_since_the_baseline():
+    scan = profile(("NodeByLabelScan", "i:Invoice", 10))
+    assert diff_reports({"old": SEEK}, {"new": scan}) == [
+        ("info", "new", "not in baseline"),
+        ("warning", "new", "uses NodeByLabelScan (1x)"),
+        ("info", "old", "missing from this run"),
+    ]
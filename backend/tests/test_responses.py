@@ -0,0 +1,108 @@
+import gzip
+from datetime import datetime
+
+import orjson
+import pytest
+from bson import ObjectId
+
+import responses
+from responses import json_response, negotiate_encoding
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.headers = {k.replace("_", "-"): v for k, v in headers.items()}
+
+
+BIG = {"items": [{"id": f"INV-{i:04}", "status": "Matched", "tax": i * 1.5} for i in range(200)]}
+
+
+@pytest.fixture
+def without_brotli(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("gzip, deflate", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("identity", None),
+    ("", None),
+    (None, None),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("gzip;q=abc", None),
+])
+def test_negotiate_gzip(without_brotli, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    """Stand-in brotli module, so br negotiation is tested whether or not brotli is installed"""
+    class FakeBrotli:
+        @staticmethod
+        def compress(body, quality):
+            return b"br:" + body
+    monkeypatch.setattr(responses, "brotli", FakeBrotli)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0.1", "gzip"),
+    ("*", "br"),
+])
+def test_negotiate_prefers_brotli_at_equal_quality(with_brotli, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_brotli_body(with_brotli):
+    response = json_response(FakeRequest(accept_encoding="br"), BIG)
+    assert response.headers["Content-Encoding"] == "br"
+    assert response.body == b"br:" + responses.dumps(BIG)
+
+
+def test_without_brotli_br_is_never_offered(without_brotli):
+    assert negotiate_encoding("br") is None
+
+
+def test_small_bodies_are_not_compressed():
+    response = json_response(FakeRequest(accept_encoding="gzip"), {"ok": True})
+    assert "Content-Encoding" not in response.headers
+    assert orjson.loads(response.body) == {"ok": True}
+
+
+def test_large_bodies_are_gzipped_with_their_own_etag(without_brotli):
+    plain = json_response(FakeRequest(), BIG)
+    zipped = json_response(FakeRequest(accept_encoding="gzip"), BIG)
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert zipped.headers["Vary"] == "Accept-Encoding"
+    assert orjson.loads(gzip.decompress(zipped.body)) == BIG
+    assert plain.headers["ETag"] != zipped.headers["ETag"]
+    assert zipped.headers["ETag"].endswith('-gzip"')
+
+
+def test_matching_etag_answers_304():
+    first = json_response(FakeRequest(), BIG)
+    etag = first.headers["ETag"]
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = json_response(FakeRequest(if_none_match=if_none_match), BIG)
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert not response.body
+    assert json_response(FakeRequest(if_none_match='"stale"'), BIG).status_code == 200
+
+
+def test_etag_changes_with_content():
+    changed = {"items": BIG["items"][:-1]}
+    assert json_response(FakeRequest(), BIG).headers["ETag"] != json_response(FakeRequest(), changed).headers["ETag"]
+
+
+def test_dumps_handles_object_ids_and_datetimes():
+    oid = ObjectId()
+    body = orjson.loads(responses.dumps({"_id": oid, "at": datetime(2025, 7, 1, 12, 30), 1: "x"}))
+    assert body == {"_id": str(oid), "at": "2025-07-01T12:30:00", "1": "x"}
+    with pytest.raises(TypeError):
+        responses.dumps({"bad": object()})
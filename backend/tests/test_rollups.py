@@ -0,0 +1,93 @@
+import pytest
+
+import rollups
+
+
+def invoice(invoice_id, period="2025-07", vendor="V1", status="Matched", tax=10.0):
+    return {"id": invoice_id, "period": period, "vendorId": vendor, "matchStatus": status, "totalTax": tax}
+
+
+def add(db, *docs):
+    """Insert invoices the way the API does: write them, then roll them up"""
+    db["invoices"].insert_many([dict(d) for d in docs])
+    rollups.record_invoices(db, docs)
+
+
+def change_status(db, invoice_id, period, new):
+    doc = db["invoices"].find_one({"id": invoice_id, "period": period})
+    db["invoices"].update_one({"_id": doc["_id"]}, {"$set": {"matchStatus": new}})
+    rollups.record_status_changes(db, [(period, doc["vendorId"], doc["matchStatus"], new, doc["totalTax"])])
+
+
+def by_everything(db):
+    return rollups.query(db, group_by=("period", "vendor", "status"))
+
+
+def assert_matches_rebuild(db):
+    incremental = by_everything(db)
+    rollups.rebuild(db)
+    assert by_everything(db) == incremental
+
+
+def test_single_and_bulk_inserts_match_rebuild(mongo_db):
+    add(mongo_db, invoice("INV-1"))
+    add(mongo_db, invoice("INV-2", status="Tax Amount Mismatch", tax=25.5),
+        invoice("INV-3", vendor="V2"), invoice("INV-4", period="2025-06"),
+        invoice("INV-5", status="Tax Amount Mismatch", tax=4.5))
+    assert by_everything(mongo_db) == [
+        {"period": "2025-06", "vendor": "V1", "status": "Matched", "count": 1, "totalTax": 10.0},
+        {"period": "2025-07", "vendor": "V1", "status": "Matched", "count": 1, "totalTax": 10.0},
+        {"period": "2025-07", "vendor": "V1", "status": "Tax Amount Mismatch", "count": 2, "totalTax": 30.0},
+        {"period": "2025-07", "vendor": "V2", "status": "Matched", "count": 1, "totalTax": 10.0},
+    ]
+    assert_matches_rebuild(mongo_db)
+
+
+def test_status_changes_match_rebuild(mongo_db):
+    add(mongo_db, invoice("INV-1"), invoice("INV-2"), invoice("INV-3", tax=7))
+    change_status(mongo_db, "INV-1", "2025-07", "Missing in GSTR-1")
+    change_status(mongo_db, "INV-3", "2025-07", "HSN Mismatch")
+    change_status(mongo_db, "INV-3", "2025-07", "Matched")
+    rows = rollups.query(mongo_db, group_by=("status",))
+    assert rows == [
+        {"status": "Matched", "count": 2, "totalTax": 17.0},
+        {"status": "Missing in GSTR-1", "count": 1, "totalTax": 10.0},
+    ]
+    assert_matches_rebuild(mongo_db)
+
+
+def test_missing_fields_group_as_null_in_both_paths(mongo_db):
+    add(mongo_db, {"id": "INV-1", "period": "2025-07", "totalTax": 3}, invoice("INV-2"))
+    assert rollups.query(mongo_db, group_by=("vendor",)) == [
+        {"vendor": None, "count": 1, "totalTax": 3},
+        {"vendor": "V1", "count": 1, "totalTax": 10.0},
+    ]
+    assert_matches_rebuild(mongo_db)
+
+
+def test_query_filters_and_regroups(mongo_db):
+    add(mongo_db, *(invoice(f"INV-{p}-{v}", period=p, vendor=v)
+                    for p in ("2025-05", "2025-06", "2025-07") for v in ("V1", "V2")))
+    assert [r["period"] for r in rollups.query(mongo_db, "2025-06", "2025-07")] == ["2025-06", "2025-07"]
+    assert rollups.query(mongo_db, vendor_id="V2", group_by=("vendor",)) == [
+        {"vendor": "V2", "count": 3, "totalTax": 30.0}]
+    assert rollups.query(mongo_db, match_status="HSN Mismatch") == []
+    with pytest.raises(ValueError, match="Unknown groupBy"):
+        rollups.query(mongo_db, group_by=("gstin",))
+
+
+def test_archived_period_keeps_its_trend_through_a_rebuild(mongo_db):
+    add(mongo_db, invoice("INV-1", period="2025-04"), invoice("INV-2", period="2025-04", status="HSN Mismatch"),
+        invoice("INV-3", period="2025-07"))
+    before = by_everything(mongo_db)
+
+    # What PeriodArchiver.prune does to Mongo
+    mongo_db["invoices"].delete_many({"period": "2025-04"})
+    assert rollups.archive_period(mongo_db, "2025-04") == 2
+    assert by_everything(mongo_db) == before
+
+    rollups.rebuild(mongo_db)
+    assert by_everything(mongo_db) == before
+    # Pruning twice leaves the archived rows alone
+    assert rollups.archive_period(mongo_db, "2025-04") == 0
+    assert by_everything(mongo_db) == before
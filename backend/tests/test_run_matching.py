@@ -0,0 +1,82 @@
+import ingestion
+from ingestion import GSTIngester
+
+
+class FakeGraph:
+    """Invoices of one period: id -> (current match_status, status the filings imply)"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.reads, self.writes = [], []
+
+    def pending(self, after, limit):
+        ids = sorted(i for i, (current, target) in self.statuses.items() if current != target and i > after)
+        return [{"id": i, "status": self.statuses[i][1]} for i in ids[:limit]]
+
+    def set_status(self, ids, status=None):
+        for i in ids:
+            self.statuses[i] = (status or self.statuses[i][1], self.statuses[i][1])
+
+
+class FakeTransaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, query, period, **params):
+        if query is ingestion.PENDING_STATUS_CHANGES_QUERY:
+            rows = self.graph.pending(params["after"], params["limit"])
+            self.graph.reads.append(len(rows))
+            return rows
+        if query is ingestion.LINK_MATCHES_QUERY:
+            self.graph.writes.append(len(params["ids"]))
+            self.graph.set_status(params["ids"])
+        elif query is ingestion.MARK_UNMATCHED_QUERY:
+            self.graph.writes.append(len(params["rows"]))
+            self.graph.set_status([row["id"] for row in params["rows"]])
+
+
+class FakeSession:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute_read(self, work, **kwargs):
+        return work(FakeTransaction(self.graph), **kwargs)
+
+    execute_write = execute_read
+
+
+class FakeDriver:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def session(self, **kwargs):
+        return FakeSession(self.graph)
+
+
+def run(monkeypatch, statuses, batch_size):
+    graph = FakeGraph(statuses)
+    monkeypatch.setattr(ingestion, "get_driver", lambda *args: FakeDriver(graph))
+    return GSTIngester().run_matching("2025-07", batch_size=batch_size), graph
+
+
+def test_pending_changes_are_read_a_page_at_a_time(monkeypatch):
+    statuses = {f"INV-{i:03}": (None, "Matched" if i % 3 else "Missing in GSTR-1") for i in range(25)}
+    statuses.update({f"OK-{i}": ("Matched", "Matched") for i in range(5)})
+    counts, graph = run(monkeypatch, statuses, batch_size=10)
+
+    assert counts == {"matched": 16, "unmatched": 9}
+    assert graph.reads == [10, 10, 5]
+    assert max(graph.writes) <= 10 and sum(graph.writes) == 25
+    assert all(current == target for current, target in graph.statuses.values())
+
+
+def test_exact_page_boundary_reads_one_empty_page(monkeypatch):
+    counts, graph = run(monkeypatch, {f"INV-{i}": (None, "Matched") for i in range(4)}, batch_size=2)
+    assert counts == {"matched": 4, "unmatched": 0}
+    assert graph.reads == [2, 2, 0]
@@ -0,0 +1,90 @@
+import pytest
+
+import rollups
+import sync
+from sync import ReconciliationSync
+
+
+def invoice(invoice_id, period, status="Matched", vendor="V1", tax=10):
+    return {"id": invoice_id, "period": period, "vendorId": vendor, "gstin": "27AAAAA0000A1Z5",
+            "matchStatus": status, "totalTax": tax}
+
+
+def mismatch(invoice_id, issue="Missing in GSTR-1", tax=25):
+    return {"invoice_id": invoice_id, "issue_type": issue, "vendor_gstin": "27AAAAA0000A1Z5",
+            "vendor_name": "Acme", "tax": tax, "amount": 100}
+
+
+def rollup_rows(db):
+    return rollups.query(db, group_by=("period", "vendor", "status"))
+
+
+def assert_rollups_match_rebuild(db):
+    incremental = rollup_rows(db)
+    rollups.rebuild(db)
+    assert incremental == rollup_rows(db)
+
+
+@pytest.fixture
+def vendor_moves(monkeypatch):
+    """Status changes handed to vendor_stats (its pipeline update is covered in test_vendor_stats)"""
+    moves = []
+    monkeypatch.setattr(sync.vendor_stats, "record_status_changes",
+                        lambda db, changes, score=None, classify=None: moves.extend(changes))
+    return moves
+
+
+@pytest.fixture
+def db(mongo_db, vendor_moves):
+    mongo_db["vendors"].insert_one({"id": "V1", "gstin": "27AAAAA0000A1Z5", "name": "Acme"})
+    return mongo_db
+
+
+def seed(db, *docs):
+    db["invoices"].insert_many([dict(d) for d in docs])
+    rollups.record_invoices(db, docs)
+
+
+def test_same_invoice_id_in_another_period_is_a_new_document(db, vendor_moves):
+    seed(db, invoice("INV-1", "2025-06"))
+    summary = ReconciliationSync(db).apply({"period": "2025-07", "mismatches": [mismatch("INV-1")]})
+
+    assert summary["upserted"] == 1
+    june, july = sorted(db["invoices"].find({"id": "INV-1"}, {"_id": 0}), key=lambda d: d["period"])
+    assert june["matchStatus"] == "Matched" and "reconVersion" not in june
+    assert july["period"] == "2025-07" and july["matchStatus"] == "Missing in GSTR-1"
+    assert july["vendorId"] == "V1" and july["totalTax"] == 25
+    assert vendor_moves == [("2025-07", "V1", None, "Missing in GSTR-1", 25)]
+    assert_rollups_match_rebuild(db)
+
+
+def test_status_update_stays_in_its_period(db):
+    seed(db, invoice("INV-1", "2025-06"), invoice("INV-1", "2025-07", tax=40))
+    ReconciliationSync(db).apply({"period": "2025-07", "mismatches": [mismatch("INV-1", "HSN Mismatch")]})
+
+    statuses = {d["period"]: d["matchStatus"] for d in db["invoices"].find({"id": "INV-1"})}
+    assert statuses == {"2025-06": "Matched", "2025-07": "HSN Mismatch"}
+    assert_rollups_match_rebuild(db)
+
+
+def test_resync_clears_flags_and_writes_nothing_twice(db):
+    seed(db, invoice("INV-1", "2025-07"), invoice("INV-2", "2025-07"))
+    syncer = ReconciliationSync(db)
+    result = {"period": "2025-07", "mismatches": [mismatch("INV-1"), mismatch("INV-3", "Tax Amount Mismatch")]}
+    syncer.apply(result)
+    assert syncer.apply(result)["changed"] == 0
+    syncer.apply({"period": "2025-07", "mismatches": []})
+
+    assert {d["id"]: d["matchStatus"] for d in db["invoices"].find()} == {
+        "INV-1": "Matched", "INV-2": "Matched", "INV-3": "Matched"}
+    assert_rollups_match_rebuild(db)
+
+
+def test_update_rejected_by_a_newer_version_does_not_move_rollups(db, vendor_moves):
+    seed(db, invoice("INV-1", "2025-07"))
+    db["invoices"].update_one({"id": "INV-1"}, {"$set": {"reconVersion": 99}})
+    ReconciliationSync(db).apply({"period": "2025-07", "mismatches": [mismatch("INV-1")]})
+
+    assert db["invoices"].find_one({"id": "INV-1"})["matchStatus"] == "Matched"
+    assert vendor_moves == []
+    assert_rollups_match_rebuild(db)
@@ -0,0 +1,170 @@
+from vendor_stats import (classify_risk, days_late, invoice_deltas, needs_rescore, predict_risk,
+                          status_change_deltas, update_pipeline)
+
+
+def invoice(status="Matched", period="2025-07", vendor="V1", tax=100, **extra):
+    return {"vendorId": vendor, "period": period, "matchStatus": status, "totalTax": tax, **extra}
+
+
+def test_days_late_counts_from_the_11th_of_next_month():
+    assert days_late("2025-07", "2025-08-11") == 0
+    assert days_late("2025-07", "2025-08-20") == 9
+    assert days_late("2025-12", "2026-01-15") == 4
+    assert days_late("2025-07", "") is None
+    assert days_late("bad", "2025-08-20") is None
+
+
+def test_missed_filings_count_periods_not_invoices():
+    deltas = invoice_deltas([invoice("Missing in GSTR-1") for _ in range(5)]
+                            + [invoice("Missing in GSTR-1", period="2025-08")])
+    assert deltas["V1"]["missedPeriods"] == {"2025-07", "2025-08"}
+    assert deltas["V1"]["tx"] == 6
+    assert deltas["V1"]["mismatches"] == 6
+    assert deltas["V1"]["taxAtRisk"] == 600
+
+
+def test_missed_period_falls_back_to_invoice_date():
+    deltas = invoice_deltas([invoice("Missing in GSTR-1", period="", date="2025-09-03")])
+    assert deltas["V1"]["missedPeriods"] == {"2025-09"}
+
+
+def test_invoices_without_vendor_are_ignored():
+    assert invoice_deltas([invoice(vendor="")]) == {}
+    assert status_change_deltas([("2025-07", None, "Matched", "Missing in GSTR-1", 10)]) == {}
+
+
+def test_status_changes_move_mismatches_and_missed_periods():
+    deltas = status_change_deltas([
+        ("2025-07", "V1", "Matched", "Missing in GSTR-1", 100),
+        ("2025-07", "V1", "Missing in GSTR-1", "Tax Amount Mismatch", 50),
+        ("2025-06", "V1", "Missing in GSTR-1", "Matched", 30),
+        ("2025-07", "V2", None, "HSN Mismatch", 20),
+    ])
+    v1 = deltas["V1"]
+    assert v1["tx"] == 0
+    assert v1["mismatches"] == 0          # +1, 0, -1
+    assert v1["taxAtRisk"] == 70          # +100, 0, -30
+    assert v1["missedPeriods"] == {"2025-07"}
+    assert v1["clearedPeriods"] == {"2025-07", "2025-06"}
+    assert deltas["V2"]["tx"] == 1 and deltas["V2"]["mismatches"] == 1
+
+
+def test_a_period_both_missed_and_cleared_stays_missed():
+    d = status_change_deltas([
+        ("2025-07", "V1", "Missing in GSTR-1", "Matched", 10),
+        ("2025-07", "V1", "Matched", "Missing in GSTR-1", 10),
+    ])["V1"]
+    removed = update_pipeline(d)[1]["$set"]["missedPeriods"]["$setDifference"][1]
+    assert removed == {"$literal": []}
+
+
+def test_rescore_only_when_inputs_cross_a_threshold():
+    scored = {"totalTransactions": 40, "missedFilings": 1, "avgDaysLate": 2.0}
+    assert not needs_rescore({**scored, "totalTransactions": 49, "scoredOn": scored})
+    assert needs_rescore({**scored, "totalTransactions": 50, "scoredOn": scored})
+    assert needs_rescore({**scored, "missedFilings": 2, "scoredOn": scored})
+    assert not needs_rescore({**scored, "avgDaysLate": 2.9, "scoredOn": scored})
+    assert needs_rescore({**scored, "avgDaysLate": 3.0, "scoredOn": scored})
+
+
+# ---- update_pipeline, evaluated stage by stage ----
+# mongomock has no $setDifference / $round, so the few expression operators the
+# pipeline uses are evaluated here with MongoDB's semantics.
+_OPERATORS = {
+    "$literal": lambda args, doc: args,
+    "$ifNull": lambda args, doc: next((v for v in (_eval(a, doc) for a in args) if v is not None), None),
+    "$add": lambda args, doc: sum(_eval(a, doc) for a in args),
+    "$multiply": lambda args, doc: _eval(args[0], doc) * _eval(args[1], doc),
+    "$divide": lambda args, doc: _eval(args[0], doc) / _eval(args[1], doc),
+    "$gt": lambda args, doc: _eval(args[0], doc) > _eval(args[1], doc),
+    "$cond": lambda args, doc: _eval(args[1] if _eval(args[0], doc) else args[2], doc),
+    "$size": lambda args, doc: len(_eval(args, doc)),
+    "$round": lambda args, doc: round(_eval(args[0], doc), args[1]),
+    "$setUnion": lambda args, doc: sorted(set().union(*(_eval(a, doc) for a in args))),
+    "$setDifference": lambda args, doc: sorted(set(_eval(args[0], doc)) - set(_eval(args[1], doc))),
+}
+
+
+def _eval(expr, doc):
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc.get(expr[1:])
+    if isinstance(expr, dict):
+        if len(expr) == 1 and next(iter(expr)).startswith("$"):
+            (op, args), = expr.items()
+            return _OPERATORS[op](args, doc)
+        return {key: _eval(value, doc) for key, value in expr.items()}
+    return expr
+
+
+def run_pipeline(doc, pipeline):
+    for stage in pipeline:
+        doc = {**doc, **{field: _eval(expr, doc) for field, expr in stage["$set"].items()}}
+    return doc
+
+
+VENDOR = {"id": "V1", "totalTransactions": 40, "missedFilings": 1, "avgDaysLate": 2.0}
+INVOICES = [
+    invoice("Matched", "2025-06", gstr1FiledDate="2025-07-11"),
+    invoice("Missing in GSTR-1", "2025-06", tax=40),
+    invoice("Tax Amount Mismatch", "2025-07", tax=15, gstr1FiledDate="2025-08-20"),
+    invoice("Missing in GSTR-1", "2025-07", tax=60),
+    invoice("Missing in GSTR-1", "2025-07", tax=5),
+    invoice("Matched", "2025-08", gstr1FiledDate="2025-09-15"),
+]
+
+
+def recompute(vendor, invoices):
+    """The aggregates computed from scratch over every invoice"""
+    late = [days_late(i["period"], i["gstr1FiledDate"]) for i in invoices if "gstr1FiledDate" in i]
+    unmatched = [i for i in invoices if i["matchStatus"] != "Matched"]
+    samples = vendor["totalTransactions"] + len(late)
+    return {
+        "totalTransactions": vendor["totalTransactions"] + len(invoices),
+        "missedFilings": vendor["missedFilings"] + len({i["period"] for i in invoices
+                                                        if i["matchStatus"] == "Missing in GSTR-1"}),
+        "mismatches": len(unmatched),
+        "taxAtRisk": sum(i["totalTax"] for i in unmatched),
+        "avgDaysLate": round((vendor["avgDaysLate"] * vendor["totalTransactions"] + sum(late)) / samples, 1),
+    }
+
+
+def aggregates(vendor):
+    return {k: vendor[k] for k in ("totalTransactions", "missedFilings", "mismatches", "taxAtRisk", "avgDaysLate")}
+
+
+def test_one_invoice_at_a_time_matches_a_full_recompute():
+    vendor = VENDOR
+    for inv in INVOICES:
+        vendor = run_pipeline(vendor, update_pipeline(invoice_deltas([inv])["V1"]))
+    assert aggregates(vendor) == recompute(VENDOR, INVOICES)
+    assert vendor["missedPeriods"] == ["2025-06", "2025-07"]
+    # The inputs the vendor was last scored on are seeded once and left alone
+    assert vendor["scoredOn"] == {"totalTransactions": 40, "missedFilings": 1, "avgDaysLate": 2.0}
+
+
+def test_status_changes_match_a_full_recompute():
+    vendor = run_pipeline(VENDOR, update_pipeline(invoice_deltas(INVOICES)["V1"]))
+    # 2025-06's only missing invoice turns up; one of 2025-07's two does
+    changes = [("2025-06", "V1", "Missing in GSTR-1", "Matched", 40),
+               ("2025-07", "V1", "Missing in GSTR-1", "Matched", 60)]
+    final = [dict(INVOICES[0]), invoice("Matched", "2025-06", tax=40), *INVOICES[2:3],
+             invoice("Matched", "2025-07", tax=60), *INVOICES[4:]]
+    delta = status_change_deltas(changes)["V1"]
+    # record_status_changes confirms cleared periods against invoices still missing
+    delta["clearedPeriods"] -= {i["period"] for i in final if i["matchStatus"] == "Missing in GSTR-1"}
+    vendor = run_pipeline(vendor, update_pipeline(delta))
+
+    assert aggregates(vendor) == recompute(VENDOR, final)
+    assert vendor["missedPeriods"] == ["2025-07"]
+
+
+def test_vendor_without_aggregates_is_seeded_from_its_stored_fields():
+    vendor = run_pipeline({"id": "V1"}, update_pipeline(invoice_deltas([invoice("Missing in GSTR-1")])["V1"]))
+    assert aggregates(vendor) == {"totalTransactions": 1, "missedFilings": 1, "mismatches": 1,
+                                  "taxAtRisk": 100, "avgDaysLate": 0}
+
+
+def test_heuristic_score_and_classes():
+    assert classify_risk(predict_risk({"missedFilings": 6, "avgDaysLate": 20, "totalTransactions": 10})) == "High Risk"
+    assert classify_risk(predict_risk({"missedFilings": 0, "avgDaysLate": 0, "totalTransactions": 500})) == "Compliant"
+    assert 0.05 <= predict_risk({}) <= 0.95
@@ -0,0 +1,236 @@
+"""
+Vendor Running Aggregates
+Keeps the per-vendor fields predict_risk() reads (totalTransactions, missedFilings,
+avgDaysLate) plus mismatches / taxAtRisk current as invoices arrive or change status
+in a reconciliation sync, and rescores only vendors whose inputs moved enough to
+change the score materially.
+
+missedFilings counts filing periods, not invoices: `missedPeriods` holds the periods
+with an invoice missing from the vendor's GSTR-1, on top of the count the vendor was
+registered with (`missedFilingsBase`).
+
+Each vendor is updated with one atomic pipeline update, so concurrent invoice
+writes never lose increments. `scoredOn` remembers the inputs of the last scoring;
+the rescoring decision compares against it rather than against the previous write,
+so many small moves still add up to a rescore.
+"""
+
+from datetime import date
+
+from pymongo import UpdateOne
+
+
+GSTR1_DUE_DAY = 11           # GSTR-1 is due on the 11th of the following month
+TX_BUCKETS = (50, 100)       # totalTransactions thresholds used by predict_risk
+LATENESS_STEP = 1.0          # avgDaysLate must move a full day to trigger a rescore
+MISSING_GSTR1 = "Missing in GSTR-1"
+
+SCORED_FIELDS = ("totalTransactions", "missedFilings", "avgDaysLate")
+_SCORED_INPUTS = {field: {"$ifNull": [f"${field}", 0]} for field in SCORED_FIELDS}
+
+# Pipeline stage for any other scorer (e.g. the ML rescore job): record the inputs
+# the new score was based on, so threshold checks restart from there
+SNAPSHOT_SCORED_INPUTS = {"$set": {"scoredOn": _SCORED_INPUTS}}
+
+
+def days_late(period, filed_on):
+    """Days past the GSTR-1 due date for a YYYY-MM period, or None when unknown"""
+    if not period or not filed_on:
+        return None
+    try:
+        year, month = (int(p) for p in period.split("-")[:2])
+        filed = date.fromisoformat(str(filed_on)[:10])
+    except ValueError:
+        return None
+    due = date(year + month // 12, month % 12 + 1, GSTR1_DUE_DAY)
+    return max((filed - due).days, 0)
+
+
+def _filing_period(inv):
+    return inv.get("period") or str(inv.get("date") or "")[:7] or None
+
+
+def _delta(deltas, vendor_id):
+    return deltas.setdefault(vendor_id, {"tx": 0, "mismatches": 0, "taxAtRisk": 0.0, "lateDays": 0,
+                                         "lateSamples": 0, "missedPeriods": set(), "clearedPeriods": set()})
+
+
+def invoice_deltas(invoices):
+    """Fold invoice documents into {vendorId: {field: increment}}"""
+    deltas = {}
+    for inv in invoices:
+        vendor_id = inv.get("vendorId")
+        if not vendor_id:
+            continue
+        d = _delta(deltas, vendor_id)
+        d["tx"] += 1
+        status = inv.get("matchStatus", "Matched")
+        if status != "Matched":
+            d["mismatches"] += 1
+            d["taxAtRisk"] += inv.get("totalTax") or 0
+        if status == MISSING_GSTR1 and _filing_period(inv):
+            d["missedPeriods"].add(_filing_period(inv))
+        late = days_late(inv.get("period"), inv.get("gstr1FiledDate"))
+        if late is not None:
+            d["lateDays"] += late
+            d["lateSamples"] += 1
+    return deltas
+
+
+def status_change_deltas(changes):
+    """
+    Fold status changes [(period, vendorId, old_status, new_status, totalTax)] (the
+    rollups.record_status_changes shape; old_status None = new invoice) into deltas.
+    Periods that lost a missing invoice land in clearedPeriods, to be confirmed by
+    the caller: another invoice may still be missing in that period.
+    """
+    deltas = {}
+    for period, vendor_id, old, new, tax in changes:
+        if not vendor_id:
+            continue
+        d = _delta(deltas, vendor_id)
+        if old is None:
+            d["tx"] += 1
+        moved = (new != "Matched") - (old is not None and old != "Matched")
+        d["mismatches"] += moved
+        d["taxAtRisk"] += moved * (tax or 0)
+        if period and new == MISSING_GSTR1:
+            d["missedPeriods"].add(period)
+        elif period and old == MISSING_GSTR1:
+            d["clearedPeriods"].add(period)
+    return deltas
+
+
+def _add(field, amount, default=0):
+    return {"$add": [{"$ifNull": [f"${field}", default]}, amount]}
+
+
+def update_pipeline(d):
+    """
+    Aggregation-pipeline update applying one vendor's deltas.
+    Vendors created before aggregates existed are seeded from their stored
+    avgDaysLate, treated as the average over their existing transactions, and
+    their stored missedFilings, kept as the base the missed periods add to.
+    """
+    return [
+        {"$set": {
+            "scoredOn": {"$ifNull": ["$scoredOn", _SCORED_INPUTS]},
+            "missedPeriods": {"$ifNull": ["$missedPeriods", []]},
+            "missedFilingsBase": {"$ifNull": ["$missedFilingsBase", {"$ifNull": ["$missedFilings", 0]}]},
+            "lateSamples": {"$ifNull": ["$lateSamples", {"$ifNull": ["$totalTransactions", 0]}]},
+            "lateDaysSum": {"$ifNull": ["$lateDaysSum", {"$multiply": [
+                {"$ifNull": ["$avgDaysLate", 0]}, {"$ifNull": ["$totalTransactions", 0]}]}]},
+        }},
+        {"$set": {
+            "totalTransactions": _add("totalTransactions", d["tx"]),
+            "missedPeriods": {"$setDifference": [
+                {"$setUnion": ["$missedPeriods", {"$literal": sorted(d["missedPeriods"])}]},
+                {"$literal": sorted(d["clearedPeriods"] - d["missedPeriods"])},
+            ]},
+            "mismatches": _add("mismatches", d["mismatches"]),
+            "taxAtRisk": _add("taxAtRisk", d["taxAtRisk"]),
+            "lateSamples": {"$add": ["$lateSamples", d["lateSamples"]]},
+            "lateDaysSum": {"$add": ["$lateDaysSum", d["lateDays"]]},
+        }},
+        {"$set": {
+            "missedFilings": {"$add": ["$missedFilingsBase", {"$size": "$missedPeriods"}]},
+            "avgDaysLate": {"$cond": [
+                {"$gt": ["$lateSamples", 0]},
+                {"$round": [{"$divide": ["$lateDaysSum", "$lateSamples"]}, 1]},
+                {"$ifNull": ["$avgDaysLate", 0]},
+            ]},
+        }},
+    ]
+
+
+def predict_risk(vendor):
+    """Heuristic vendor risk score in [0.05, 0.95] (same logic as the frontend)"""
+    missed = min(vendor.get("missedFilings", 0) / 6, 1)
+    late = min(vendor.get("avgDaysLate", 0) / 20, 1)
+    tx = vendor.get("totalTransactions", 100)
+    tx_score = 0.8 if tx < 50 else (0.4 if tx < 100 else 0.1)
+    einv = 0.7 if vendor.get("missedFilings", 0) > 2 else 0.2
+
+    score = missed * 0.28 + late * 0.22 + tx_score * 0.12 + einv * 0.12 + 0.3 * 0.08
+    return min(max(score, 0.05), 0.95)
+
+
+def classify_risk(score):
+    if score >= 0.6:
+        return "High Risk"
+    if score >= 0.3:
+        return "Review"
+    return "Compliant"
+
+
+def _bucket(tx):
+    return sum(tx >= t for t in TX_BUCKETS)
+
+
+def needs_rescore(vendor):
+    """True when the vendor's inputs crossed a threshold since it was last scored"""
+    scored = vendor.get("scoredOn") or {}
+    return (
+        _bucket(vendor.get("totalTransactions", 0)) != _bucket(scored.get("totalTransactions", 0))
+        or vendor.get("missedFilings", 0) != scored.get("missedFilings", 0)
+        or abs(vendor.get("avgDaysLate", 0) - scored.get("avgDaysLate", 0)) >= LATENESS_STEP
+    )
+
+
+def scored_inputs(vendor):
+    return {k: vendor.get(k, 0) for k in SCORED_FIELDS}
+
+
+def _apply(db, deltas, score, classify):
+    if not deltas:
+        return []
+    vendors = db["vendors"]
+    vendors.bulk_write([UpdateOne({"id": vid}, update_pipeline(d)) for vid, d in deltas.items()],
+                       ordered=False)
+    if score is None:
+        return []
+
+    rescored, ops = [], []
+    projection = {"_id": 0, "id": 1, "name": 1, "status": 1, "scoredOn": 1,
+                  "totalTransactions": 1, "missedFilings": 1, "avgDaysLate": 1}
+    for vendor in vendors.find({"id": {"$in": list(deltas)}}, projection):
+        if not needs_rescore(vendor):
+            continue
+        risk_score = round(score(vendor), 2)
+        status = classify(risk_score)
+        ops.append(UpdateOne({"id": vendor["id"]}, {"$set": {
+            "riskScore": risk_score, "status": status, "scoredOn": scored_inputs(vendor),
+        }}))
+        rescored.append({"id": vendor["id"], "name": vendor.get("name", ""), "riskScore": risk_score,
+                         "status": status, "previousStatus": vendor.get("status")})
+    if ops:
+        vendors.bulk_write(ops, ordered=False)
+    return rescored
+
+
+def record_invoices(db, invoices, score, classify):
+    """
+    Apply newly inserted invoices to their vendors' aggregates and rescore the
+    vendors that need it. `score` / `classify` are predict_risk / classify_risk.
+    Returns [{"id", "name", "riskScore", "status", "previousStatus"}] for rescored vendors.
+    """
+    return _apply(db, invoice_deltas(invoices), score, classify)
+
+
+def record_status_changes(db, changes, score=None, classify=None):
+    """
+    Apply reconciliation status changes (see status_change_deltas) that have already
+    been written to `invoices`. Without `score` only the aggregates move; the next
+    scoring picks them up from `scoredOn`.
+    """
+    deltas = status_change_deltas(changes)
+    cleared = {(vid, p) for vid, d in deltas.items() for p in d["clearedPeriods"]}
+    if cleared:
+        for inv in db["invoices"].find({
+            "vendorId": {"$in": list({vid for vid, _ in cleared})},
+            "period": {"$in": list({p for _, p in cleared})},
+            "matchStatus": MISSING_GSTR1,
+        }, {"_id": 0, "vendorId": 1, "period": 1}):
+            # Still missing through another invoice: the period stays missed
+            deltas[inv["vendorId"]]["clearedPeriods"].discard(inv["period"])
+    return _apply(db, deltas, score, classify)